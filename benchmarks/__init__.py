@@ -0,0 +1,5 @@
+import os
+
+# settings require telegram credentials, which offline benchmarks never use
+os.environ.setdefault("API_ID", "0")
+os.environ.setdefault("API_HASH", "benchmark")
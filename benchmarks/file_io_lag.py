@@ -0,0 +1,85 @@
+"""
+Event loop lag caused by codes.json / user_agents.json writes: blocking writes on the loop as before
+against bot.utils.file_io (dedicated thread, atomic rename, coalescing).
+
+    python -m benchmarks.file_io_lag --sessions 2000 --codes 5000
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from bot.utils.file_io import FileIO
+
+
+def user_agents(sessions: int) -> list[dict]:
+    return [{"session_name": f"session_{index}", "user_agent": "Mozilla/5.0 (Linux; Android 13) Chrome/127.0.0.0 "
+             f"Mobile Safari/537.36 {index}"} for index in range(sessions)]
+
+
+def codes(count: int) -> dict:
+    return {"codes": [{"name": f"Video {index}", "code": f"CODE{index}", "id": str(index)} for index in range(count)]}
+
+
+async def monitor_lag(stop: asyncio.Event, interval: float, lags: list[float]):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+
+async def run(mode: str, directory: str, sessions: int, code_count: int, interval: float) -> dict:
+    agents, codes_data = user_agents(sessions), codes(code_count)
+    agents_file, codes_file = os.path.join(directory, "user_agents.json"), os.path.join(directory, "codes.json")
+    file_io = FileIO()
+    stop, lags = asyncio.Event(), []
+    monitor = asyncio.create_task(monitor_lag(stop, interval, lags))
+
+    async def session(index: int):
+        # every new session appends its user agent and rewrites the whole file, every 10th one saves codes
+        await asyncio.sleep(index * 0.0005)
+        snapshot = agents[:index + 1]
+        if mode == "blocking":
+            with open(agents_file, "w") as f:
+                json.dump(snapshot, f, indent=4)
+            if index % 10 == 0:
+                with open(codes_file, "w") as f:
+                    json.dump(codes_data, f, indent=2, ensure_ascii=False)
+        else:
+            await file_io.write_json(agents_file, snapshot, indent=4)
+            if index % 10 == 0:
+                await file_io.write_json(codes_file, codes_data, indent=2, ensure_ascii=False)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(session(index) for index in range(sessions)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await monitor
+    with open(agents_file) as f:
+        assert len(json.load(f)) == sessions, "the last write must win"
+    lags.sort()
+    return {
+        "mode": mode,
+        "seconds": round(elapsed, 3),
+        "max_lag_ms": round(lags[-1] * 1000, 2) if lags else 0,
+        "p99_lag_ms": round(lags[int(len(lags) * 0.99)] * 1000, 2) if lags else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument("--codes", type=int, default=5000)
+    parser.add_argument("--interval", type=float, default=0.005, help="loop lag sampling interval, seconds")
+    args = parser.parse_args()
+    report = []
+    for mode in ("blocking", "file_io"):
+        with tempfile.TemporaryDirectory() as directory:
+            report.append(asyncio.run(run(mode, directory, args.sessions, args.codes, args.interval)))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Drives N fake accounts through MemeFiApi against the mock gateway and reports throughput.
+
+    python -m benchmarks.load_test --accounts 500 --cycles 3 --latency 0.05
+    python -m benchmarks.load_test --url http://127.0.0.1:8080/graphql   # mock started separately
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from urllib.parse import urlencode
+
+from aiohttp import ClientSession, TCPConnector
+
+from benchmarks.mock_gateway import MockGateway, start_mock_gateway
+from bot.config import settings
+from bot.core.memefi_api import MemeFiApi
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+class TimedMemeFiApi(MemeFiApi):
+
+    latencies: list[float]
+
+    def __init__(self, *args, latencies: list[float], **kwargs):
+        super().__init__(*args, **kwargs)
+        self.latencies = latencies
+
+    async def _post(self, body: bytes, operation: str):
+        start = time.perf_counter()
+        try:
+            return await super()._post(body, operation)
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+
+
+def fake_web_data(user_id: int) -> dict:
+    user = {"id": user_id, "first_name": f"User{user_id}", "last_name": "", "username": f"user{user_id}",
+            "language_code": "en"}
+    query = urlencode({"query_id": f"AAH{user_id}", "user": json.dumps(user), "auth_date": int(time.time()),
+                       "hash": f"{user_id:064x}"})
+    return {"https://tg-app.memefi.club/game#tgWebAppData": [query]}
+
+
+async def account_cycle(api: MemeFiApi):
+    await api.get_profile_data()
+    for _ in range(3):
+        await api.send_taps(taps=random.randint(*settings.RANDOM_TAPS_COUNT))
+    await api.set_next_boss()
+    await api.get_bot_config()
+    await api.start_bot()
+    await api.claim_bot()
+    for _ in range(2):
+        await api.play_slotmachine(spin_value=1)
+    for campaign in await api.get_campaigns():
+        for task in await api.get_tasks_list(campaign["id"]):
+            await api.verify_campaign(task["id"])
+            await api.complete_task(task["userTaskId"], code="code")
+    await api.airdrop_check()
+
+
+async def run_account(index: int, url: str, connector: TCPConnector, cycles: int, latencies: list[float]) -> int:
+    errors = 0
+    async with ClientSession(connector=connector, connector_owner=False) as session:
+        api = TimedMemeFiApi(session=session, account=f"bench-{index}", api_url=url, latencies=latencies)
+        await api.auth_with_web_data(fake_web_data(100_000 + index))
+        for _ in range(cycles):
+            try:
+                await account_cycle(api)
+            except Exception:
+                errors += 1
+    return errors
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def max_rss_mb() -> float | None:
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def run_benchmark(accounts: int, cycles: int, url: str | None, gateway: MockGateway) -> dict:
+    runner = None
+    if url is None:
+        runner, url = await start_mock_gateway(gateway)
+    latencies: list[float] = []
+    connector = TCPConnector(limit=0)
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    try:
+        results = await asyncio.gather(*(run_account(index, url, connector, cycles, latencies)
+                                         for index in range(accounts)), return_exceptions=True)
+    finally:
+        await connector.close()
+        if runner:
+            await runner.cleanup()
+    wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+    failed_cycles = sum(result if isinstance(result, int) else cycles for result in results)
+    return {
+        "accounts": accounts,
+        "cycles": cycles,
+        "failed_cycles": failed_cycles,
+        "requests": len(latencies),
+        "seconds": round(wall, 3),
+        "requests_per_second": round(len(latencies) / wall, 1) if wall else 0,
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "cpu_seconds": round(cpu, 3),
+        "cpu_ms_per_request": round(cpu * 1000 / len(latencies), 3) if latencies else 0,
+        "max_rss_mb": max_rss_mb(),
+        "mock_in_process": runner is not None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--accounts", type=int, default=100)
+    parser.add_argument("--cycles", type=int, default=1)
+    parser.add_argument("--url", help="external mock gateway; by default it runs in this process")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", action="store_true", help="keep RATE_LIMIT_* budgets enabled")
+    args = parser.parse_args()
+
+    settings.RATE_LIMIT = args.rate_limit
+    gateway = MockGateway(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                          throttle_rate=args.throttle_rate)
+    report = asyncio.run(run_benchmark(args.accounts, args.cycles, args.url, gateway))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
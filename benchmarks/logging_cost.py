@@ -0,0 +1,76 @@
+"""
+Measures how much event loop time logging takes with the different LOG_* modes.
+
+    python -m benchmarks.logging_cost --sessions 1000 --messages 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from loguru import logger as base_logger
+
+from bot.utils.logger import fmt, RepeatFilter, ThreadedSink
+
+MODES = {
+    "sync_colored": dict(format=fmt, colorize=True),
+    "sync_plain": dict(format=fmt, colorize=False),
+    "sync_json": dict(serialize=True),
+    "loguru_enqueue_plain": dict(format=fmt, colorize=False, enqueue=True),
+    "threaded_plain": dict(format=fmt, colorize=False, threaded=True),
+    "threaded_json": dict(serialize=True, threaded=True),
+    "threaded_plain_rate_limited": dict(format=fmt, colorize=False, threaded=True, rate_limit=True),
+}
+
+
+async def session(index: int, messages: int, spent: list[float]):
+    log = base_logger.opt(colors=True).bind(name=f"session_{index}")
+    for spin in range(messages):
+        start = time.perf_counter()
+        log.info(f"🎰 Casino game | Balance: <lc>{spin * 1000:,}</lc> (<lg>+{spin:,}</lg> <lm>Coins</lm>) "
+                 f"| Spins: <le>{messages - spin:,}</le> ")
+        log.info(f"🎟 ETH Lottery status: False | 🎫 Ticket number: <yellow>{spin}</yellow>")
+        spent.append(time.perf_counter() - start)
+        await asyncio.sleep(0)
+
+
+def run_mode(name: str, options: dict, sessions: int, messages: int, sink_path: str) -> dict:
+    options = dict(options)
+    threaded = options.pop("threaded", False)
+    if options.pop("rate_limit", False):
+        options["filter"] = RepeatFilter(0.2, 5)
+    base_logger.remove()
+    with open(sink_path, "w") as stream:
+        sink = ThreadedSink(stream) if threaded else stream
+        base_logger.add(sink=sink, level="INFO", **options)
+        spent: list[float] = []
+
+        async def run():
+            await asyncio.gather(*(session(index, messages, spent) for index in range(sessions)))
+
+        asyncio.run(run())
+        base_logger.remove()
+        if threaded:
+            sink.stop()
+    calls = len(spent) * 2
+    total = sum(spent)
+    return {"mode": name, "calls": calls, "loop_seconds": round(total, 3),
+            "us_per_call": round(total * 1e6 / calls, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=1000)
+    parser.add_argument("--messages", type=int, default=20, help="casino spins logged per session")
+    parser.add_argument("--sink", help="file to write logs to, temporary file by default")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        sink_path = args.sink or os.path.join(directory, "bench.log")
+        report = [run_mode(name, options, args.sessions, args.messages, sink_path) for name, options in MODES.items()]
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
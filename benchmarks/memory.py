@@ -0,0 +1,94 @@
+"""
+Memory footprint per session: N sessions waiting for a concurrency slot with `--active` of them running,
+pyrogram Clients created upfront for every session (as before) or only for the running ones.
+
+    python -m benchmarks.memory --sessions 100 1000 10000 --active 100
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+
+
+def rss_mb() -> float | None:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        return None
+
+
+async def simulate(sessions: int, active: int, eager: bool) -> dict:
+    from bot.core.tapper import Tapper
+    from bot.core.telegram import create_tg_client
+    from bot.utils.logger import logger
+    from bot.utils.rate_limiter import rate_limiter
+
+    user_agents = [{"session_name": f"session_{index}", "user_agent": f"Mozilla/5.0 (Linux; Android 13) {index}"}
+                   for index in range(sessions)]
+    Tapper._user_agents = user_agents
+    semaphore, release, running = asyncio.Semaphore(active), asyncio.Event(), []
+
+    async def session(name: str, tg_client):
+        session_logger = logger.opt(colors=True).bind(name=name)
+        async with semaphore:
+            tapper = Tapper(tg_client or create_tg_client(name), session_logger)
+            tapper.user_agent = await tapper.check_user_agent()
+            tapper.game.update({"coinsAmount": 0, "spinEnergyTotal": 50, "currentBoss": {"level": 1}})
+            rate_limiter._buckets_for("https://api-gw-tg.memefi.club/graphql", None, name,
+                                      ["MutationGameProcessTapsBatch"])
+            running.append(tapper)
+            await release.wait()
+
+    rss_before = rss_mb()
+    tracemalloc.start()
+    names = [f"session_{index}" for index in range(sessions)]
+    clients = {name: create_tg_client(name) for name in names} if eager else {}
+    tasks = [asyncio.create_task(session(name, clients.get(name))) for name in names]
+    while len(running) < min(active, sessions):
+        await asyncio.sleep(0)
+    current, _ = tracemalloc.get_traced_memory()
+    rss_after = rss_mb()
+    tracemalloc.stop()
+    release.set()
+    await asyncio.gather(*tasks)
+    return {
+        "sessions": sessions,
+        "active": active,
+        "clients": "eager" if eager else "lazy",
+        "traced_mb": round(current / 2 ** 20, 2),
+        "traced_kb_per_session": round(current / 1024 / sessions, 2),
+        "rss_delta_mb": round(rss_after - rss_before, 2) if rss_before is not None else None,
+    }
+
+
+def run_isolated(sessions: int, active: int, eager: bool) -> dict:
+    """Every measurement in a fresh interpreter, so RSS of one run does not leak into the next."""
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(os.environ, STATE_FILE=os.path.join(directory, "state.sqlite3"))
+        result = subprocess.run([sys.executable, "-m", "benchmarks.memory", "--single", str(sessions),
+                                 "--active", str(active)] + (["--eager"] if eager else []),
+                                capture_output=True, text=True, env=env, check=True)
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--active", type=int, default=100, help="sessions holding a concurrency slot")
+    parser.add_argument("--single", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--eager", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.single:
+        print(json.dumps(asyncio.run(simulate(args.single, args.active, args.eager))))
+        return
+    report = [run_isolated(sessions, args.active, eager) for sessions in args.sessions for eager in (True, False)]
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+"""
+Local stand-in for api-gw-tg.memefi.club/graphql with a simple in-memory game model.
+
+    python -m benchmarks.mock_gateway --port 8080 --latency 0.05 --error-rate 0.01
+"""
+import argparse
+import asyncio
+import random
+from datetime import datetime, timedelta, timezone
+from secrets import token_hex
+
+from aiohttp import web
+
+
+def _iso(delta: float = 0) -> str:
+    return (datetime.now(timezone.utc) + timedelta(seconds=delta)).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+class Account:
+
+    def __init__(self, user: dict):
+        self.user = user
+        self.coins = 0
+        self.energy = 1000
+        self.max_energy = 1000
+        self.boss_level = 1
+        self.boss_health = 1000
+        self.spins = 50
+        self.tapbot_started_at: str | None = None
+        self.tapbot_attempts = 0
+        self.tasks: dict[str, str] = {}
+
+    def game_config(self) -> dict:
+        return {
+            "_id": str(self.user.get("id")),
+            "coinsAmount": self.coins,
+            "currentEnergy": self.energy,
+            "maxEnergy": self.max_energy,
+            "weaponLevel": 0,
+            "zonesCount": 1,
+            "tapsReward": 0,
+            "energyLimitLevel": 0,
+            "energyRechargeLevel": 0,
+            "tapBotLevel": 0,
+            "currentBoss": {"_id": str(self.boss_level), "level": self.boss_level,
+                            "currentHealth": self.boss_health, "maxHealth": 1000 * self.boss_level},
+            "freeBoosts": {"_id": "boosts", "currentTurboAmount": 3, "maxTurboAmount": 3,
+                           "turboLastActivatedAt": None, "turboAmountLastRechargeDate": _iso(),
+                           "currentRefillEnergyAmount": 6, "maxRefillEnergyAmount": 6,
+                           "refillEnergyLastActivatedAt": None, "refillEnergyAmountLastRechargeDate": _iso()},
+            "bonusLeaderDamageEndAt": None,
+            "bonusLeaderDamageStartAt": None,
+            "bonusLeaderDamageMultiplier": 1,
+            "nonce": token_hex(26),
+            "spinEnergyNextRechargeAt": _iso(3600),
+            "spinEnergyNonRefillable": 0,
+            "spinEnergyRefillable": self.spins,
+            "spinEnergyTotal": self.spins,
+            "spinEnergyStaticLimit": 50,
+        }
+
+    def tapbot(self) -> dict:
+        return {"damagePerSec": 1, "endsAt": _iso(3 * 3600) if self.tapbot_started_at else None, "id": "tapbot",
+                "isPurchased": True, "startsAt": self.tapbot_started_at, "totalAttempts": 3,
+                "usedAttempts": self.tapbot_attempts}
+
+    def task(self, task_id: str) -> dict:
+        return {"id": task_id, "name": f"Video {task_id}", "description": "", "status": self.tasks.get(task_id, "New"),
+                "type": "YoutubeVisit", "position": 0, "buttonText": "", "coinsRewardAmount": 1000,
+                "spinEnergyRewardAmount": 1, "link": "", "userTaskId": task_id, "isRequired": False, "iconUrl": "",
+                "taskVerificationType": "SecretCode", "verificationAvailableAt": _iso(1), "shouldUseVpn": False,
+                "isLinkInternal": False, "quiz": None}
+
+
+class MockGateway:
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 throttle_rate: float = 0.0, campaigns: int = 2, tasks_per_campaign: int = 3):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.campaigns = campaigns
+        self.tasks_per_campaign = tasks_per_campaign
+        self.accounts: dict[str, Account] = {}
+        self.requests = 0
+        self.handlers = {
+            "MutationTelegramUserLogin": self.login,
+            "QUERY_GAME_CONFIG": lambda account, _: {"telegramGameGetConfig": account.game_config()},
+            "MutationGameProcessTapsBatch": self.taps,
+            "telegramGameSetNextBoss": self.next_boss,
+            "TapbotConfig": lambda account, _: {"telegramGameTapbotGetConfig": account.tapbot()},
+            "TapbotStart": self.tapbot_start,
+            "TapbotClaim": self.tapbot_claim,
+            "spinSlotMachine": self.spin,
+            "CampaignLists": self.campaign_lists,
+            "GetTasksList": self.tasks_list,
+            "GetTaskById": lambda account, variables: {"campaignTaskGetConfig": account.task(variables["taskId"])},
+            "CampaignTaskToVerification": self.task_to_verification,
+            "CampaignTaskMarkAsCompleted": self.task_complete,
+            "QueryTelegramUserMe": self.user_me,
+            "AirdropTodoTasks": self.airdrop_todo,
+            "AirdropOkxOffChainClaimWalletConfig": lambda *_: {"airdropOkxOffChainClaimWalletConfig": None},
+            "TelegramMemefiWallet": lambda account, _: {"telegramMemefiWallet": {
+                "walletAddress": f"0x{account.user.get('id', 0):040x}", "dropMemefiAmountWei": "0",
+                "signedTransaction": None}},
+            "ClanMy": lambda *_: {"clanMy": None},
+            "ClanActionJoinClan": lambda *_: {"clanActionJoinClan": True},
+            "Mutation": lambda *_: {"telegramUserClaimReferralBonus": True},
+        }
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/graphql", self.handle)
+        return app
+
+    def _account(self, request: web.Request) -> Account | None:
+        token = request.headers.get("Authorization", "").removeprefix("Bearer ")
+        return self.accounts.get(token)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        if self.latency or self.jitter:
+            await asyncio.sleep(max(0.0, random.gauss(self.latency, self.jitter)))
+        if random.random() < self.throttle_rate:
+            return web.json_response({"message": "Too Many Requests"}, status=429, headers={"Retry-After": "1"})
+        if random.random() < self.error_rate:
+            return web.json_response({"message": "Internal Server Error"}, status=500)
+        payload = await request.json()
+        account = self._account(request)
+        if isinstance(payload, list):
+            return web.json_response([self.execute(account, operation) for operation in payload])
+        return web.json_response(self.execute(account, payload))
+
+    def execute(self, account: Account | None, operation: dict) -> dict:
+        name = operation.get("operationName")
+        handler = self.handlers.get(name)
+        if handler is None:
+            return {"errors": [{"message": f"Unknown operation {name}"}], "data": None}
+        if account is None and name != "MutationTelegramUserLogin":
+            return {"errors": [{"message": "Unauthorized"}], "data": None}
+        return {"data": handler(account, operation.get("variables") or {})}
+
+    def login(self, _, variables: dict) -> dict:
+        user = variables["webAppData"]["user"]
+        token = f"token-{user.get('id')}"
+        if token not in self.accounts:
+            self.accounts[token] = Account(user)
+        return {"telegramUserLogin": {"access_token": token}}
+
+    @staticmethod
+    def taps(account: Account, variables: dict) -> dict:
+        taps = min(variables["payload"]["tapsCount"], account.energy)
+        account.energy -= taps
+        account.coins += taps
+        account.boss_health = max(0, account.boss_health - taps)
+        return {"telegramGameProcessTapsBatch": account.game_config()}
+
+    @staticmethod
+    def next_boss(account: Account, _) -> dict:
+        account.boss_level += 1
+        account.boss_health = 1000 * account.boss_level
+        return {"telegramGameSetNextBoss": account.game_config()}
+
+    @staticmethod
+    def tapbot_start(account: Account, _) -> dict:
+        account.tapbot_started_at = _iso()
+        account.tapbot_attempts += 1
+        return {"telegramGameTapbotStart": account.tapbot()}
+
+    @staticmethod
+    def tapbot_claim(account: Account, _) -> dict:
+        account.coins += 10_000
+        account.tapbot_started_at = None
+        return {"telegramGameTapbotClaimCoins": account.tapbot()}
+
+    @staticmethod
+    def spin(account: Account, variables: dict) -> dict:
+        spins = min(variables["payload"]["spinsCount"], account.spins)
+        account.spins -= spins
+        reward = random.choice([0, 100, 1000]) * spins
+        account.coins += reward
+        return {"slotMachineSpinV2": {
+            "gameConfig": account.game_config(),
+            "spinResults": [{"id": token_hex(4), "combination": ["coin", "coin", "coin"], "rewardAmount": reward,
+                             "rewardType": "Coins", "questItemsFromSpin": 0}],
+            "spinsProcessedCount": spins,
+            "previousProgressBarConfig": None,
+            "nextProgressBarConfig": None,
+            "progressBarReward": None,
+            "ethLotteryConfig": {"requiredItems": 10, "collectedItems": 0, "isCompleted": False,
+                                 "ticketNumber": None, "itemsFromSpin": 0, "maybePreviousCycleWinner": None},
+        }}
+
+    def campaign_lists(self, *_) -> dict:
+        campaigns = [{"id": f"campaign-{index}", "type": "Normal", "status": "Active", "description": "YouTube video",
+                      "name": f"Campaign {index}", "isStarted": True, "totalTasksAmount": self.tasks_per_campaign}
+                     for index in range(self.campaigns)]
+        return {"campaignLists": {"special": [], "normal": campaigns, "archivedCount": 0}}
+
+    def tasks_list(self, account: Account, variables: dict) -> dict:
+        campaign_id = variables["campaignId"]
+        return {"campaignTasks": [account.task(f"{campaign_id}-task-{index}")
+                                  for index in range(self.tasks_per_campaign)]}
+
+    @staticmethod
+    def task_to_verification(account: Account, variables: dict) -> dict:
+        task_id = variables["taskConfigId"]
+        account.tasks[task_id] = "Verification"
+        return {"campaignTaskMoveToVerificationV2": account.task(task_id)}
+
+    @staticmethod
+    def task_complete(account: Account, variables: dict) -> dict:
+        task_id = variables["userTaskId"]
+        account.tasks[task_id] = "Completed"
+        account.coins += 1000
+        return {"campaignTaskMarkAsCompleted": account.task(task_id)}
+
+    @staticmethod
+    def user_me(account: Account, _) -> dict:
+        user = account.user
+        return {"telegramUserMe": {
+            "firstName": user.get("first_name"), "lastName": user.get("last_name"), "telegramId": user.get("id"),
+            "username": user.get("username"), "referralCode": "r_mock", "isDailyRewardClaimed": True,
+            "allocationNano": "0", "isCheatDetected": False, "referral": None, "_id": str(user.get("id")),
+            "isReferralInitialJoinBonusAvailable": False, "league": "Bronze",
+            "okxSuiTask": {"completionRewardCoins": 0, "okxSuiWallet": None, "status": "New"},
+        }}
+
+    @staticmethod
+    def airdrop_todo(account: Account, _) -> dict:
+        item = {"currentAmount": 0, "done": False, "requiredAmount": 1}
+        return {"airdropTodoTasks": {"campaigns": item, "coins": {**item, "currentAmount": account.coins},
+                                     "ethLotteryTickets": item, "premium": {"done": False},
+                                     "starTransactions": item, "tonTransactions": item}}
+
+
+async def start_mock_gateway(gateway: MockGateway, host: str = "127.0.0.1", port: int = 0) -> tuple[web.AppRunner, str]:
+    runner = web.AppRunner(gateway.app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host=host, port=port)
+    await site.start()
+    port = runner.addresses[0][1]
+    return runner, f"http://{host}:{port}/graphql"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0, help="mean response latency, seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="latency standard deviation, seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of 500 responses")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="share of 429 responses")
+    args = parser.parse_args()
+    gateway = MockGateway(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                          throttle_rate=args.throttle_rate)
+    web.run_app(gateway.app(), host=args.host, port=args.port, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Replays recorded cassette (CASSETTE_MODE=record) offline through MemeFiApi and reports CPU cost per account.
+
+    python -m benchmarks.replay cassettes/traffic.jsonl.gz --timing fast
+"""
+import argparse
+import asyncio
+import json
+import time
+from collections import defaultdict
+
+from aiohttp import ClientSession
+
+from bot.config import settings
+from bot.core.memefi_api import MemeFiApi
+from bot.utils.cassette import cassette
+
+
+async def replay_account(account: str, entries: list[dict], timing: str) -> int:
+    errors = 0
+    started = time.monotonic()
+    first = entries[0]["t"]
+    async with ClientSession() as session:
+        api = MemeFiApi(session=session, account=account)
+        for entry in entries:
+            if timing == "original":
+                await asyncio.sleep(max(0.0, entry["t"] - first - (time.monotonic() - started)))
+            try:
+                await api._send_request(json.loads(entry["request"]))
+            except Exception:
+                errors += 1
+    return errors
+
+
+async def run_replay(filename: str, timing: str) -> dict:
+    cassette.configure("replay", filename, timing)
+    accounts: dict[str, list[dict]] = defaultdict(list)
+    for entry in cassette.entries():
+        if entry["kind"] == "graphql" and entry["request"]:
+            accounts[entry["account"]].append(entry)
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    errors = await asyncio.gather(*(replay_account(account, entries, timing) for account, entries in accounts.items()))
+    wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+    requests = sum(len(entries) for entries in accounts.values())
+    return {
+        "accounts": len(accounts),
+        "requests": requests,
+        "errors": sum(errors),
+        "seconds": round(wall, 3),
+        "cpu_seconds": round(cpu, 3),
+        "cpu_ms_per_account": round(cpu * 1000 / len(accounts), 3) if accounts else 0,
+        "cpu_ms_per_request": round(cpu * 1000 / requests, 3) if requests else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("cassette", nargs="?", default=settings.CASSETTE_FILE)
+    parser.add_argument("--timing", choices=("original", "fast"), default="fast")
+    args = parser.parse_args()
+    settings.RATE_LIMIT = False
+    print(json.dumps(asyncio.run(run_replay(args.cassette, args.timing)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Startup cost of the entry point: `python -X importtime` report per module and time to the first API request.
+
+    python -m benchmarks.startup --top 15
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.mock_gateway import MockGateway, start_mock_gateway
+
+FIRST_REQUEST_SCRIPT = """
+import asyncio
+import bot.core.tapper
+from aiohttp import ClientSession
+from benchmarks.load_test import fake_web_data
+from bot.core.memefi_api import MemeFiApi
+
+async def main():
+    async with ClientSession() as session:
+        await MemeFiApi(session=session, api_url={url!r}).auth_with_web_data(fake_web_data(1))
+
+asyncio.run(main())
+"""
+
+
+def import_times(module: str) -> list[tuple[str, int, int]]:
+    """(module, self us, cumulative us) of every import done by `import <module>`."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, env=os.environ.copy())
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        times.append((name.strip(), int(self_us), int(cumulative_us)))
+    return times
+
+
+def import_report(module: str, top: int) -> dict:
+    times = import_times(module)
+    total = next((cumulative for name, _, cumulative in times if name == module), 0)
+    heaviest = sorted(times, key=lambda item: item[2], reverse=True)[1:top + 1]
+    return {
+        "module": module,
+        "total_ms": round(total / 1000, 1),
+        "modules": len(times),
+        "heaviest": [{"module": name, "cumulative_ms": round(cumulative / 1000, 1)} for name, _, cumulative in heaviest],
+    }
+
+
+async def time_to_first_request() -> float:
+    runner, url = await start_mock_gateway(MockGateway())
+    try:
+        start = time.perf_counter()
+        process = await asyncio.create_subprocess_exec(sys.executable, "-c", FIRST_REQUEST_SCRIPT.format(url=url))
+        await process.wait()
+        return time.perf_counter() - start
+    finally:
+        await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+    report = {
+        "imports": [import_report(module, args.top) for module in ("main", "bot.core.tapper")],
+        "time_to_first_request_ms": round(asyncio.run(time_to_first_request()) * 1000, 1),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
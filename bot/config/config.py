@@ -45,11 +45,110 @@ class Settings(BaseSettings):
     LINEA_WALLET: bool = True
     LINEA_SHOW_BALANCE: bool = False
     LINEA_API: str = ''
+    LINEA_BATCH_WINDOW: float = 0.5
+    LINEA_CACHE_TTL: int = 600
 
     USE_RANDOM_DELAY_IN_RUN: bool = True
     RANDOM_DELAY_IN_RUN: list[int] = [3, 15]
 
     WATCH_VIDEO: bool = True
 
+    AUTO_CASINO: bool = False
+    AUTO_NEXT_BOSS: bool = False
+    AUTO_TAPBOT: bool = False
+    AUTO_CAMPAIGNS: bool = False
+
+    ACCOUNT_CONCURRENCY: int = 3
+
+    ADMISSION_WEIGHTS: dict[str, float] = {"tapbot_claim": 10, "tapbot_start": 4, "spin": 0.2, "campaign_task": 2,
+                                           "unknown": 5}
+    ADMISSION_AGING: float = 1
+
+    RATE_LIMIT: bool = True
+    RATE_LIMIT_HOST: list[float] = [20, 40]
+    RATE_LIMIT_HOSTS: dict[str, list[float]] = {"api.lineascan.build": [4, 5]}
+    RATE_LIMIT_PROXY: list[float] = [5, 10]
+    RATE_LIMIT_ACCOUNT: list[float] = [1, 5]
+    RATE_LIMIT_OPERATIONS: dict[str, list[float]] = {"MutationGameProcessTapsBatch": [0.2, 1]}
+    RATE_LIMIT_DEFAULT_RETRY_AFTER: int = 10
+    RATE_LIMIT_MAX_RETRY_AFTER: int = 120
+
+    ADAPTIVE_CONCURRENCY: bool = True
+    CONCURRENCY_LIMITS: list[int] = [5, 20, 1000]
+    CONCURRENCY_TARGET_P95: dict[str, float] = {"api": 3, "telegram": 10}
+    CONCURRENCY_MAX_ERROR_RATE: float = 0.05
+    CONCURRENCY_DECREASE_FACTOR: float = 0.7
+    CONCURRENCY_ADJUST_INTERVAL: int = 5
+
+    RETRY_ATTEMPTS: int = 3
+    RETRY_BACKOFF: list[float] = [0.5, 20]
+    CIRCUIT_BREAKER_THRESHOLD: int = 20
+    CIRCUIT_BREAKER_RESET: int = 30
+
+    CLOCK_SYNC: bool = True
+
+    STEP_TIMEOUTS: dict[str, float] = {"proxy": 30, "web_data": 300, "login": 120, "api": 60}
+    SUPERVISOR_STALL_TIMEOUT: int = 600
+    SUPERVISOR_CHECK_INTERVAL: int = 15
+    SUPERVISOR_BACKOFF: list[float] = [30, 900]
+    SUPERVISOR_MAX_RESTARTS: int = 5
+
+    METRICS: bool = False
+    METRICS_HOST: str = '127.0.0.1'
+    METRICS_PORT: int = 9108
+
+    CONTROL: bool = False
+    CONTROL_HOST: str = '127.0.0.1'
+    CONTROL_PORT: int = 9109
+    CONTROL_SOCKET: str = ''
+    CONTROL_TOKEN: str = ''
+
+    DIAGNOSTICS: bool = False
+    LOOP_LAG_INTERVAL: float = 0.5
+    SLOW_CALLBACK_MS: int = 100
+    PROFILE_DURATION: int = 30
+    PROFILE_INTERVAL_MS: int = 5
+    PROFILE_DIR: str = 'profiles'
+
+    CASSETTE_MODE: str = ''
+    CASSETTE_FILE: str = 'cassettes/traffic.jsonl.gz'
+    CASSETTE_REPLAY_TIMING: str = 'original'
+
+    LOG_LEVEL: str = 'INFO'
+    LOG_ENQUEUE: bool = False
+    LOG_JSON: bool = False
+    LOG_FILE: str = ''
+    LOG_RATE_LIMIT: list[float] = []
+
+    TG_MAX_CONNECTS: int = 10
+    TG_PER_DC_CONCURRENCY: int = 20
+    TG_FLOOD_WAIT_RETRIES: int = 3
+    TG_MAX_FLOOD_WAIT: int = 900
+    TG_KEEP_CONNECTED: int = 0
+
+    WATCH_INTERVAL: int = 30
+
+    STATE_FILE: str = 'state.sqlite3'
+    STATE_FLUSH_INTERVAL: float = 5
+
+    CF_PREWARM: bool = True
+    CF_WARM_CONCURRENCY: int = 10
+    CF_CLEARANCE_FILE: str = 'cf_clearance.json'
+    CF_CLEARANCE_TTL: int = 1800
+
+    LEASES: bool = False
+    LEASE_FILE: str = 'leases.sqlite3'
+    LEASE_TTL: int = 60
+    NODE_ID: str = ''
+
+    REPORT_FILE: str = 'report.csv'
+    REPORT_CONCURRENCY: int = 50
+
+    SESSION_CHECK_FILE: str = 'session_check.json'
+    SESSION_CHECK_WORKERS: int = 0
+    SESSION_CHECK_LIVENESS: bool = False
+    SESSION_CHECK_CONCURRENCY: int = 20
+    SESSION_CHECK_TTL: int = 86400
+
 
 settings = Settings()
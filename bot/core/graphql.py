@@ -29,6 +29,9 @@ class Query(str, Enum):
     OkxStatuses = "query QueryTelegramUserMe {\n  telegramUserMe {\n    firstName\n    lastName\n    telegramId\n    username\n    referralCode\n    isDailyRewardClaimed\n    allocationNano\n    referral {\n\tusername\n\tlastName\n\tfirstName\n\tbossLevel\n\tcoinsAmount\n\t__typename\n    }\n    isReferralInitialJoinBonusAvailable\n    league\n    leagueIsOverTop10k\n    leaguePosition\n    _id\n    opens {\n\tisAvailable\n\topenType\n\t__typename\n    }\n    features\n    role\n    earlyAdopterBonusAmount\n    earlyAdopterBonusPercentage\n    hasPremiumSubscription\n    binanceTask {\n\tbinanceId\n\tstatus\n\tcompletionRewardCoins\n\tvalidationRewardCoins\n\t__typename\n    }\n    okxTask {\n\tcompletionRewardCoins\n\tokxWallet\n\tstatus\n\tokxTonWallet\n\t__typename\n    }\n    okxSuiTask {\n\tcompletionRewardCoins\n\tokxSuiWallet\n\tstatus\n\t__typename\n    }\n    okxKycTask {\n\tcompletionRewardCoins\n\tokxId\n\tstatus\n\t__typename\n    }\n    tonShopTask {\n\tcoinsReward\n\tspinEnergyReward\n\tcompletedAt\n\tminPurchasedSpinEnergy\n\tstartedAt\n\t__typename\n    }\n    __typename\n  }\n}"
     AirdropTodoTasks = "query AirdropTodoTasks {\n  airdropTodoTasks {\n    campaigns {\n      currentAmount\n      done\n      requiredAmount\n      __typename\n    }\n    coins {\n      currentAmount\n      done\n      requiredAmount\n      __typename\n    }\n    ethLotteryTickets {\n      currentAmount\n      done\n      requiredAmount\n      __typename\n    }\n    premium {\n      done\n      __typename\n    }\n    starTransactions {\n      currentAmount\n      done\n      requiredAmount\n      __typename\n    }\n    tonTransactions {\n      currentAmount\n      done\n      requiredAmount\n      __typename\n    }\n    __typename\n  }\n}"
     AirdropOkxOffChainClaimWalletConfig = "query AirdropOkxOffChainClaimWalletConfig {\n  airdropOkxOffChainClaimWalletConfig {\n    canChangeUntil\n    wallet {\n      okxId\n      walletAddress\n      __typename\n    }\n    __typename\n  }\n}"
+    # lean variants for hot paths, same operation names, only fields Tapper reads
+    QueryTelegramUserMeLean = "query QueryTelegramUserMe {\n  telegramUserMe {\n    _id\n    isCheatDetected\n    allocationNano\n    okxSuiTask {\n      okxSuiWallet\n      __typename\n    }\n    __typename\n  }\n}"
+    SpinSlotMachineLean = "mutation spinSlotMachine($payload: SlotMachineSpinInput!) {\n  slotMachineSpinV2(payload: $payload) {\n    gameConfig {\n      coinsAmount\n      spinEnergyTotal\n      __typename\n    }\n    spinResults {\n      rewardAmount\n      rewardType\n      __typename\n    }\n    ethLotteryConfig {\n      isCompleted\n      ticketNumber\n      __typename\n    }\n    __typename\n  }\n}"
 
 class OperationName(str, Enum):
     QUERY_GAME_CONFIG = "QUERY_GAME_CONFIG"
@@ -51,7 +54,28 @@ class OperationName(str, Enum):
     CampaignLists = "CampaignLists"
     GetTasksList = "GetTasksList"
     GetCampaignById = "GetCampaignById"
+    GetTaskById = "GetTaskById"
+    CampaignTaskToVerification = "CampaignTaskToVerification"
+    CampaignTaskMarkAsCompleted = "CampaignTaskMarkAsCompleted"
     MutationCatsOkxComplete = "MutationCatsOkxComplete"
     OkxStatuses = "QueryTelegramUserMe"
     AirdropTodoTasks = "AirdropTodoTasks"
     AirdropOkxOffChainClaimWalletConfig = "AirdropOkxOffChainClaimWalletConfig"
+
+
+class Profile(str, Enum):
+    """Field selection of a document: LEAN for hot paths, FULL for reporting."""
+    LEAN = "lean"
+    FULL = "full"
+
+
+_LEAN = {
+    Query.QueryTelegramUserMe: Query.QueryTelegramUserMeLean,
+    Query.SpinSlotMachine: Query.SpinSlotMachineLean,
+}
+
+
+def document(query: Query, profile: Profile = Profile.FULL) -> Query:
+    if profile is Profile.LEAN:
+        return _LEAN.get(query, query)
+    return query
@@ -1,29 +1,59 @@
-from json import loads
+import asyncio
+from contextlib import nullcontext
+from json import loads, dumps
 from random import randint
+from secrets import token_hex
+from time import monotonic, time
 from urllib.parse import parse_qs
 
 from aiohttp import ClientSession, ContentTypeError
 
+from bot.utils.cassette import cassette
+from bot.utils.concurrency import concurrency, classify_exception, classify_status
+from bot.utils.linea import linea
 from bot.utils.logger import logger
-from .graphql import Query, OperationName
+from bot.utils import metrics
+from bot.utils.rate_limiter import rate_limiter
+from bot.utils.resilience import resilient, Retry
+from bot.utils.server_clock import server_clock, ServerClock
+from bot.utils.supervisor import supervisor
+from .graphql import Query, OperationName, Profile, document
 
 
 _log = logger.opt(colors=True).bind(name=__package__)
 
 
 class MemeFiApiError(Exception):
-    pass
+
+    @property
+    def messages(self) -> list[str]:
+        """Messages of the GraphQL errors of the response."""
+        errors = self.args[0] if self.args and isinstance(self.args[0], list) else []
+        return [str(error.get("message", "")) for error in errors if isinstance(error, dict)]
 
 
 class MemeFiApi:
     _session: ClientSession
     _refresh_token: str | None
+    _proxy: str | None
+    _account: str | None
 
     _api_url = "https://api-gw-tg.memefi.club/graphql"
-    _linea_url = "https://api.lineascan.build/"
 
-    def __init__(self, session: ClientSession):
+    def __init__(self, session: ClientSession, proxy: str | None = None, account: str | None = None,
+                 api_url: str | None = None, max_concurrent: int | None = None):
         self._session = session
+        self._proxy = proxy
+        self._account = account
+        # in-flight requests of the account when several sub-workflows share the session
+        self._slots = asyncio.Semaphore(max_concurrent) if max_concurrent else nullcontext()
+        if api_url:
+            self._api_url = api_url
+
+    @property
+    def clock(self) -> ServerClock:
+        """Gateway clock, server timestamps (endsAt, verificationAvailableAt, ...) are compared with it."""
+        return server_clock(self._api_url)
 
     @staticmethod
     def error_wrapper(method):
@@ -34,8 +64,44 @@ class MemeFiApi:
                 _log.opt(exception=e).error(f"Error on {type(self).__name__}.{method.__name__} | {type(e).__name__}: {e}")
         return wrapper
 
+    async def _post(self, body: bytes, operation: str):
+        proxy = metrics.proxy_label(self._proxy)
+        metrics.request_bytes.inc(len(body), operation=operation, direction="out")
+        start, sent = monotonic(), time()
+        try:
+            if cassette.replaying:
+                request = await cassette.play("graphql", self._api_url, self._account, operation)
+            else:
+                request = await self._session.post(url=self._api_url, data=body,
+                                                   headers={"Content-Type": "application/json"})
+                self.clock.observe(request.headers.get("Date"), sent, time())
+                if cassette.recording:
+                    await cassette.record("graphql", self._api_url, self._account, operation, body, request,
+                                          monotonic() - start)
+            outcome = classify_status(request.status, request.headers)
+            if outcome is None:
+                metrics.request_bytes.inc(len(await request.read()), operation=operation, direction="in")
+        except Exception as e:
+            outcome = classify_exception(e)
+            metrics.request_latency.observe(monotonic() - start, operation=operation, proxy=proxy, outcome=outcome)
+            concurrency.record("api", monotonic() - start, outcome)
+            raise
+        metrics.request_latency.observe(monotonic() - start, operation=operation, proxy=proxy, outcome=outcome or "ok")
+        concurrency.record("api", monotonic() - start, outcome)
+        return request
+
     async def _send_request(self, request_data: list | dict) -> dict | list:
-        request = await self._session.post(url=self._api_url, json=request_data)
+        requests = request_data if isinstance(request_data, list) else [request_data]
+        operations = [data.get("operationName") for data in requests]
+        operation = "+".join(getattr(name, "value", name) for name in operations)
+        body = dumps(request_data).encode()
+        await rate_limiter.acquire(self._api_url, proxy=self._proxy, account=self._account, operations=operations)
+        async with self._slots:
+            request = await supervisor.step(self._account, operation, self._post(body, operation))
+        if request.status == 429:
+            # the exit point waits out Retry-After in the rate limiter, @resilient retries from its own budget
+            delay = rate_limiter.throttle(self._api_url, self._proxy, request.headers.get("Retry-After"))
+            _log.warning(f"{self._account} | Too many requests, retry after <y>{delay:.1f}s</y>")
         request.raise_for_status()
         try:
             response = await request.json()
@@ -45,15 +111,18 @@ class MemeFiApi:
             raise MemeFiApiError
         if isinstance(response, dict):
             if response.get("errors"):
+                metrics.graphql_errors.inc(operation=operation)
                 raise MemeFiApiError(response.get("errors"))
             return response.get("data")
         if isinstance(response, list):
             for response_data in response:
                 if response_data.get("errors"):
+                    metrics.graphql_errors.inc(operation=operation)
                     raise MemeFiApiError(response_data.get("errors"))
             return response
         raise ValueError("unknown data type")
 
+    @resilient(OperationName.MutationTelegramUserLogin)
     async def auth_with_web_data(self, web_data: dict):
         query = parse_qs(web_data.get("https://tg-app.memefi.club/game#tgWebAppData")[0])
         user_string = query.get("user", ['{}'])[0]
@@ -83,15 +152,21 @@ class MemeFiApi:
             'query': Query.MutationTelegramUserLogin,
         }
         for _ in range(2):
-            response_json = await self._send_request(json_data)
+            try:
+                response_json = await self._send_request(json_data)
+            except Exception:
+                metrics.logins.inc(outcome="error")
+                raise
 
             if 'errors' in response_json:
                 raise Exception(f'get_access_token msg: {response_json["errors"][0]["message"]}')
 
             access_token = response_json.get('telegramUserLogin', {}).get('access_token', '')
             self._session.headers["Authorization"] = f"Bearer {access_token}"
+            metrics.logins.inc(outcome="ok")
 
     @error_wrapper
+    @resilient(OperationName.QUERY_GAME_CONFIG)
     async def get_profile_data(self):
         json_data = {
             'operationName': OperationName.QUERY_GAME_CONFIG,
@@ -105,6 +180,7 @@ class MemeFiApi:
         return profile_data
 
     @error_wrapper
+    @resilient(OperationName.TelegramMemefiWallet)
     async def get_linea_walled_address(self):
         json_data = {
             'operationName': OperationName.TelegramMemefiWallet,
@@ -117,6 +193,7 @@ class MemeFiApi:
         return response
 
     @error_wrapper
+    @resilient(OperationName.TelegramWalletLink, retry=Retry.UNSENT_ONLY)
     async def set_new_linea_wallet(self, address, signature) -> bool:
         json_data = {
             'operationName': OperationName.TelegramWalletLink,
@@ -132,6 +209,12 @@ class MemeFiApi:
         return response_json.get("telegramWalletLink") == True
 
     @error_wrapper
+    async def get_linea_balance(self, address: str) -> int | None:
+        # batched with the other sessions and cached, see bot.utils.linea
+        return await linea.get_balance(address)
+
+    @error_wrapper
+    @resilient(OperationName.OkxStatuses)
     async def get_sui_wallet_address(self):
         json_data = {
             'operationName': OperationName.OkxStatuses,
@@ -143,6 +226,7 @@ class MemeFiApi:
 
 
     @error_wrapper
+    @resilient(OperationName.AirdropTodoTasks)
     async def get_airdrop_to_do_task(self):
         json_data = {
             'operationName': OperationName.AirdropTodoTasks,
@@ -156,6 +240,7 @@ class MemeFiApi:
 
 
     @error_wrapper
+    @resilient(OperationName.telegramGameSetNextBoss, retry=Retry.UNSENT_ONLY)
     async def set_next_boss(self):
         json_data = {
             'operationName': OperationName.telegramGameSetNextBoss,
@@ -164,16 +249,18 @@ class MemeFiApi:
         }
         return await self._send_request(json_data)
 
-    async def get_telegram_me(self):
+    @resilient(OperationName.QueryTelegramUserMe)
+    async def get_telegram_me(self, profile: Profile = Profile.FULL):
         json_data = {
             'operationName': OperationName.QueryTelegramUserMe,
-            'query': Query.QueryTelegramUserMe,
+            'query': document(Query.QueryTelegramUserMe, profile),
             'variables': {}
         }
         response_json = await self._send_request(json_data)
         return response_json.get('telegramUserMe', {})
 
-    async def airdrop_check(self):
+    @resilient(OperationName.AirdropTodoTasks)
+    async def airdrop_check(self, profile: Profile = Profile.LEAN):
         json_data = [
             {
                 'operationName': OperationName.AirdropTodoTasks,
@@ -185,13 +272,41 @@ class MemeFiApi:
                 'variables': {}
             }, {
                 'operationName': OperationName.QueryTelegramUserMe,
-                'query': Query.QueryTelegramUserMe,
+                'query': document(Query.QueryTelegramUserMe, profile),
                 'variables': {}
             }
         ]
         response_json = await self._send_request(json_data)
         return response_json
 
+    @resilient(OperationName.AirdropTodoTasks)
+    async def fleet_report(self) -> dict:
+        """Airdrop checklist, allocation, cheat flag and wallets of the account in one batched request."""
+        json_data = [
+            {
+                'operationName': OperationName.AirdropTodoTasks,
+                'query': Query.AirdropTodoTasks,
+                'variables': {}
+            }, {
+                'operationName': OperationName.AirdropOkxOffChainClaimWalletConfig,
+                'query': Query.AirdropOkxOffChainClaimWalletConfig,
+                'variables': {}
+            }, {
+                'operationName': OperationName.QueryTelegramUserMe,
+                'query': Query.QueryTelegramUserMe,
+                'variables': {}
+            }, {
+                'operationName': OperationName.TelegramMemefiWallet,
+                'query': Query.TelegramMemefiWallet,
+                'variables': {}
+            }
+        ]
+        response_json = await self._send_request(json_data)
+        report = {}
+        for result in response_json:
+            report.update(result.get("data") or {})
+        return report
+
 
     # async def apply_boost(self, boost_type: FreeBoostType):
     #     json_data = {
@@ -213,7 +328,9 @@ class MemeFiApi:
     #     }
     #     return await self._send_request(json_data)
 
-    async def send_taps(self, nonce: str, taps: int):
+    @resilient(OperationName.MutationGameProcessTapsBatch, retry=Retry.UNSENT_ONLY)
+    async def send_taps(self, taps: int):
+        nonce = token_hex(26)
         vector_array = []
         for tap in range(taps):
             """ check if tap is greater than 4 or less than 1 and set tap to random number between 1 and 4"""
@@ -235,61 +352,67 @@ class MemeFiApi:
         return await self._send_request(json_data)
 
 
+    @resilient(OperationName.CampaignLists)
     async def get_campaigns(self):
         json_data = {
-            'operationName': "CampaignLists",
+            'operationName': OperationName.CampaignLists,
             'query': Query.CampaignLists,
             'variables': {}
         }
 
         response_json = await self._send_request(json_data)
-        campaigns = response_json.get('data', {}).get('campaignLists', {}).get('normal', [])
+        campaigns = response_json.get('campaignLists', {}).get('normal', [])
         return [campaign for campaign in campaigns if 'youtube' in campaign.get('description', '').lower()]
 
+    @resilient(OperationName.CampaignTaskToVerification, retry=Retry.UNSENT_ONLY)
     async def verify_campaign(self, task_id: str):
         json_data = {
-            'operationName': "CampaignTaskToVerification",
+            'operationName': OperationName.CampaignTaskToVerification,
             'query': Query.CampaignTaskToVerification,
             'variables': {'taskConfigId': task_id}
         }
 
         response_json = await self._send_request(json_data)
-        return response_json.get('data', {}).get('campaignTaskMoveToVerificationV2')
+        return response_json.get('campaignTaskMoveToVerificationV2')
 
 
+    @resilient(OperationName.CampaignTaskMarkAsCompleted, retry=Retry.UNSENT_ONLY)
     async def complete_task(self, user_task_id: str, code: str = None):
         json_data = {
-            'operationName': "CampaignTaskMarkAsCompleted",
+            'operationName': OperationName.CampaignTaskMarkAsCompleted,
             'query': Query.CampaignTaskMarkAsCompleted,
             'variables': {'userTaskId': user_task_id, 'verificationCode': str(code)} if code \
                 else {'userTaskId': user_task_id}
         }
 
         response_json = await self._send_request(json_data)
-        data = response_json.get('data') if isinstance(response_json.get('data'), dict) else {}
-        if data.get('campaignTaskMarkAsCompleted', {}).get("status") == "Completed":
+        data = response_json if isinstance(response_json, dict) else {}
+        if (data.get('campaignTaskMarkAsCompleted') or {}).get("status") == "Completed":
             return True
         raise Exception(f"unknown struct. status: {response_json}")
 
+    @resilient(OperationName.GetTasksList)
     async def get_tasks_list(self, campaigns_id: str):
         json_data = {
-            'operationName': "GetTasksList",
+            'operationName': OperationName.GetTasksList,
             'query': Query.GetTasksList,
             'variables': {'campaignId': campaigns_id}
         }
         response_json = await self._send_request(json_data)
-        return response_json.get('data', {}).get('campaignTasks', [])
+        return response_json.get('campaignTasks', [])
 
+    @resilient(OperationName.GetTaskById)
     async def get_task_by_id(self, task_id: str):
         json_data = {
-            'operationName': "GetTaskById",
+            'operationName': OperationName.GetTaskById,
             'query': Query.GetTaskById,
             'variables': {'taskId': task_id}
         }
 
         response_json = await self._send_request(json_data)
-        return response_json.get('data', {}).get('campaignTaskGetConfig')
+        return response_json.get('campaignTaskGetConfig')
 
+    @resilient(OperationName.ClanMy)
     async def get_clan(self):
         json_data = {
             'operationName': OperationName.ClanMy,
@@ -299,11 +422,12 @@ class MemeFiApi:
 
         response_json = await self._send_request(json_data)
 
-        data = response_json['data']['clanMy']
+        data = response_json['clanMy']
         if data and data['id']:
             return data['id']
         return False
 
+    @resilient(OperationName.Leave, retry=Retry.UNSENT_ONLY)
     async def leave_clan(self):
         json_data = {
             'operationName': OperationName.Leave,
@@ -313,10 +437,10 @@ class MemeFiApi:
 
         response_json = await self._send_request(json_data)
 
-        if response_json['data']:
-            if response_json['data']['clanActionLeaveClan']:
-                return True
+        if response_json and response_json.get('clanActionLeaveClan'):
+            return True
 
+    @resilient(OperationName.Join, retry=Retry.UNSENT_ONLY)
     async def join_clan(self):
         json_data = {
             'operationName': OperationName.Join,
@@ -325,13 +449,12 @@ class MemeFiApi:
                 'clanId': '71886d3b-1186-452d-8ac6-dcc5081ab204'
             }
         }
-        response = await self._send_request(json_data)
-        response_json = await response.json()
-        if response_json['data']:
-            if response_json['data']['clanActionJoinClan']:
-                return True
+        response_json = await self._send_request(json_data)
+        if response_json and response_json.get('clanActionJoinClan'):
+            return True
 
 
+    @resilient(OperationName.TapbotStart, retry=Retry.UNSENT_ONLY)
     async def start_bot(self):
         json_data = {
             'operationName': OperationName.TapbotStart,
@@ -339,9 +462,10 @@ class MemeFiApi:
             'variables': {}
         }
 
-        response = await self._send_request(json_data)
-        return await response.json()
+        response_json = await self._send_request(json_data)
+        return response_json.get('telegramGameTapbotStart')
 
+    @resilient(OperationName.TapbotConfig)
     async def get_bot_config(self):
         json_data = {
             'operationName': OperationName.TapbotConfig,
@@ -349,8 +473,9 @@ class MemeFiApi:
             'variables': {}
         }
         response_json = await self._send_request(json_data)
-        return response_json['data']['telegramGameTapbotGetConfig']
+        return response_json['telegramGameTapbotGetConfig']
 
+    @resilient(OperationName.TapbotClaim, retry=Retry.UNSENT_ONLY)
     async def claim_bot(self):
         json_data = {
             'operationName': OperationName.TapbotClaim,
@@ -359,21 +484,23 @@ class MemeFiApi:
         }
         response_json = await self._send_request(json_data)
 
-        return {"isClaimed": False, "data": response_json['data']["telegramGameTapbotClaim"]}
+        return {"isClaimed": False, "data": response_json["telegramGameTapbotClaimCoins"]}
 
+    @resilient(OperationName.Mutation, retry=Retry.UNSENT_ONLY)
     async def claim_referral_bonus(self):
         json_data = {
             'operationName': OperationName.Mutation,
             'query': Query.Mutation,
             'variables': {}
         }
-        response = await self._send_request(json_data)
-        return await response.json()
+        response_json = await self._send_request(json_data)
+        return response_json.get('telegramUserClaimReferralBonus')
 
-    async def play_slotmachine(self, spin_value: int):
+    @resilient(OperationName.SpinSlotMachine, retry=Retry.UNSENT_ONLY)
+    async def play_slotmachine(self, spin_value: int, profile: Profile = Profile.LEAN):
         json_data = {
             'operationName': OperationName.SpinSlotMachine,
-            'query': Query.SpinSlotMachine,
+            'query': document(Query.SpinSlotMachine, profile),
             'variables': {
                 'payload': {
                     'spinsCount': spin_value
@@ -381,4 +508,4 @@ class MemeFiApi:
             }
         }
         response_json = await self._send_request(json_data)
-        return response_json.get('data', {}).get('slotMachineSpinV2', {})
\ No newline at end of file
+        return response_json.get('slotMachineSpinV2', {})
\ No newline at end of file
@@ -0,0 +1,138 @@
+import asyncio
+import csv
+import io
+import json
+from itertools import cycle
+from time import monotonic
+
+from bot.config import settings
+from bot.core.tapper import Tapper
+from bot.core.telegram import create_tg_client, set_proxy_for_tg_client, tg_manager, \
+    TelegramInvalidSessionException
+from bot.exceptions import InvalidSession
+from bot.utils.concurrency import concurrency
+from bot.utils.file_io import file_io
+from bot.utils.linea import linea
+from bot.utils.logger import logger
+
+_log = logger.opt(colors=True).bind(name=__name__)
+
+CHECKLIST = {
+    "coins": "coins",
+    "premium": "premium",
+    "ton_transactions": "tonTransactions",
+    "star_transactions": "starTransactions",
+    "eth_lottery_tickets": "ethLotteryTickets",
+    "campaigns": "campaigns",
+}
+
+FIELDS = ("session", "telegram_id", "username", "cheat_detected", "allocation", "okx_claimed_allocation",
+          "sui_wallet", "okx_wallet", "okx_id", "linea_address", "linea_balance", *CHECKLIST, "error")
+
+
+def _coins(nano) -> float | None:
+    if isinstance(nano, str) and nano.isdigit():
+        return round(int(nano) / 1e9, 2)
+    return None
+
+
+def _checklist_item(item: dict | None) -> str:
+    if not item:
+        return ""
+    if item.get("done"):
+        return "done"
+    if item.get("requiredAmount"):
+        return f'{item.get("currentAmount") or 0}/{item.get("requiredAmount")}'
+    return "not done"
+
+
+def report_row(data: dict) -> dict:
+    """Flat row of MemeFiApi.fleet_report data."""
+    me = data.get("telegramUserMe") or {}
+    claim_wallet = (data.get("airdropOkxOffChainClaimWalletConfig") or {}).get("wallet") or {}
+    checklist = data.get("airdropTodoTasks") or {}
+    return {
+        "telegram_id": me.get("telegramId"),
+        "username": me.get("username"),
+        "cheat_detected": me.get("isCheatDetected"),
+        "allocation": _coins(me.get("allocationNano")),
+        "okx_claimed_allocation": _coins(me.get("okxClaimedAllocationNano")),
+        "sui_wallet": (me.get("okxSuiTask") or {}).get("okxSuiWallet"),
+        "okx_wallet": claim_wallet.get("walletAddress"),
+        "okx_id": claim_wallet.get("okxId"),
+        "linea_address": (data.get("telegramMemefiWallet") or {}).get("walletAddress"),
+        **{column: _checklist_item(checklist.get(key)) for column, key in CHECKLIST.items()},
+    }
+
+
+class ReportWriter:
+    """Streams rows to REPORT_FILE as they arrive: CSV, or JSON lines for .jsonl / .json."""
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.json_lines = filename.endswith((".jsonl", ".json"))
+
+    @staticmethod
+    def _csv_line(values) -> str:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(values)
+        return buffer.getvalue()
+
+    async def open(self):
+        await file_io.write_text(self.filename, "" if self.json_lines else self._csv_line(FIELDS))
+
+    async def write(self, row: dict):
+        if self.json_lines:
+            text = json.dumps({field: row.get(field) for field in FIELDS}, ensure_ascii=False) + "\n"
+        else:
+            text = self._csv_line(["" if row.get(field) is None else row[field] for field in FIELDS])
+        await file_io.append_text(self.filename, text)
+
+
+async def collect(session_name: str, proxy: str | None) -> dict:
+    """Authorizes the session and reads its report, no game actions are made."""
+    row = {"session": session_name}
+    session_logger = logger.opt(colors=True).bind(name=session_name)
+    tg_client = create_tg_client(session_name)
+    try:
+        tapper = Tapper(tg_client=tg_client, session_logger=session_logger)
+        tapper.user_agent = await tapper.check_user_agent()
+        if proxy:
+            set_proxy_for_tg_client(tapper.tg_client, proxy)
+        async with tapper.api_session(proxy) as api:
+            row.update(report_row(await api.fleet_report()))
+        if settings.LINEA_SHOW_BALANCE and row.get("linea_address"):
+            balance = await linea.get_balance(row["linea_address"])
+            row["linea_balance"] = balance / 1e18 if balance is not None else None
+    except (InvalidSession, TelegramInvalidSessionException):
+        row["error"] = "invalid session"
+    except Exception as e:
+        session_logger.debug(f"Report failed | {type(e).__name__}: {e}")
+        row["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        await tg_manager.release(tg_client)
+    return row
+
+
+async def run_report(session_names: list[str], proxies: list[str]):
+    writer = ReportWriter(settings.REPORT_FILE)
+    await writer.open()
+    semaphore = asyncio.Semaphore(settings.REPORT_CONCURRENCY)
+    proxies_cycle = cycle(proxies) if proxies else None
+    start, done, failed = monotonic(), 0, 0
+
+    async def report(session_name: str, proxy: str | None):
+        nonlocal done, failed
+        async with semaphore, concurrency.slot():
+            row = await collect(session_name, proxy)
+        await writer.write(row)
+        done += 1
+        failed += bool(row.get("error"))
+        if done % 100 == 0:
+            _log.info(f"Report: <c>{done}/{len(session_names)}</c> sessions | {failed} failed")
+
+    _log.info(f"Collecting report of {len(session_names)} sessions to <c>{writer.filename}</c>")
+    await asyncio.gather(*(report(session_name, next(proxies_cycle) if proxies_cycle else None)
+                           for session_name in session_names))
+    _log.success(f"Report of {done} sessions ({failed} failed) saved to <c>{writer.filename}</c> "
+                 f"in {monotonic() - start:.1f}s")
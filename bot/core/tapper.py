@@ -1,74 +1,122 @@
 import asyncio
 import random
 import json
+import typing
+from contextlib import asynccontextmanager
+from time import time
+from typing import TYPE_CHECKING
 
-from aiocfscrape import CloudflareScraper
 from loguru._logger import Logger
-from pyrogram import Client
 
 from bot.config import settings
 from bot.config.config import USER_AGENTS_FILE
-from bot.core.telegram import get_tg_web_data, set_proxy_for_tg_client
+from bot.core.telegram import get_tg_web_data, set_proxy_for_tg_client, create_tg_client, tg_manager, \
+    TelegramInvalidSessionException
 from bot.utils.checkers import check_proxy
 from bot.core.headers import headers
-from bot.core.agents import generate_random_user_agent
 
 from bot.exceptions import InvalidSession, InvalidProtocol
-from bot.core.memefi_api import MemeFiApi
+from bot.core.memefi_api import MemeFiApi, MemeFiApiError
+from bot.utils.cloudflare import clearance
+from bot.utils import admission
+from bot.utils.concurrency import concurrency
+from bot.utils.file_io import file_io
 from bot.utils.connector import get_connector
+from bot.utils.linea import linea
 from bot.utils.logger import logger
+from bot.utils.codes import video_codes
+from bot.utils.state import state, parse_timestamp
+from bot.utils.session_check import session_checks
+from bot.utils.supervisor import supervisor
 
+if TYPE_CHECKING:
+    from pyrogram import Client
+
+
+class GameState:
+    """Game config of the account shared by the sub-workflows, refreshed from every response that carries it."""
+
+    __slots__ = ("config",)
+
+    def __init__(self):
+        self.config: dict = {}
+
+    def update(self, config: dict | None):
+        if config:
+            self.config.update(config)
+
+    @property
+    def balance(self) -> int:
+        return self.config.get("coinsAmount", 0)
+
+    @property
+    def spins(self) -> int:
+        return self.config.get("spinEnergyTotal", 0)
+
+    @property
+    def boss(self) -> dict:
+        return self.config.get("currentBoss") or {}
 
 
 class Tapper:
 
+    __slots__ = ("tg_client", "log", "state", "session_ug_dict", "user_agent", "game", "completed", "_api",
+                 "_web_data")
+
     _api: MemeFiApi
-    _web_data: dict = None
+    # user agents of all sessions, read once and shared
+    _user_agents: list[dict] | None = None
 
-    def __init__(self, tg_client: Client, session_logger: Logger):
+    def __init__(self, tg_client: "Client", session_logger: Logger, completed: set[str] | None = None):
         self.tg_client = tg_client
+        # workflows finished by previous attempts of the session, a restart does not repeat them
+        self.completed = completed if completed is not None else set()
+        self._web_data: dict | None = None
         self.log = session_logger
-        self.session_ug_dict = self.load_user_agents() or []
-        headers['User-Agent'] = self.check_user_agent()
+        self.state = state.account(tg_client.name)
+        self.session_ug_dict: list[dict] = []
+        self.user_agent: str | None = None
+        self.game = GameState()
 
-    def save_user_agent(self):
+    async def save_user_agent(self):
 
         if not any(session['session_name'] == self.tg_client.name for session in self.session_ug_dict):
+            from bot.core.agents import generate_random_user_agent
+
             user_agent_str = generate_random_user_agent()
 
             self.session_ug_dict.append({
                 'session_name': self.tg_client.name,
                 'user_agent': user_agent_str})
 
-            with open(USER_AGENTS_FILE, 'w') as user_agents:
-                json.dump(self.session_ug_dict, user_agents, indent=4)
+            await file_io.write_json(USER_AGENTS_FILE, list(self.session_ug_dict), indent=4)
 
             self.log.info("User agent saved successfully")
 
             return user_agent_str
 
-    def load_user_agents(self):
+    async def load_user_agents(self):
+        if Tapper._user_agents is not None:
+            return Tapper._user_agents
+        session_data = []
         try:
-            with open(USER_AGENTS_FILE, 'r') as user_agents:
-                session_data = json.load(user_agents)
-                if isinstance(session_data, list):
-                    return session_data
-
-        except FileNotFoundError:
-            self.log.warning("User agents file not found, creating...")
-
+            session_data = await file_io.read_json(USER_AGENTS_FILE)
+            if session_data is None:
+                self.log.warning("User agents file not found, creating...")
         except json.JSONDecodeError:
             self.log.warning("User agents file is empty or corrupted.")
+        if Tapper._user_agents is None:
+            Tapper._user_agents = session_data if isinstance(session_data, list) else []
+        return Tapper._user_agents
 
-        return []
-
-    def check_user_agent(self):
+    async def check_user_agent(self):
+        self.session_ug_dict = await self.load_user_agents()
         load = next(
             (session['user_agent'] for session in self.session_ug_dict if session['session_name'] == self.tg_client.name),
             None)
 
         if load is None:
-            return self.save_user_agent()
+            return await self.save_user_agent()
 
         return load
 
@@ -76,7 +124,7 @@ class Tapper:
         if settings.USE_RANDOM_DELAY_IN_RUN:
             random_delay = random.uniform(settings.RANDOM_DELAY_IN_RUN[0], settings.RANDOM_DELAY_IN_RUN[1])
             self.log.info(f"Bot will start in <y>{random_delay}s</y>")
-            await asyncio.sleep(random_delay)
+            await supervisor.sleep(self.tg_client.name, random_delay)
 
 
     async def roll_casino(self, spins: int):
@@ -85,6 +133,7 @@ class Tapper:
         while spins > settings.VALUE_SPIN:
             await asyncio.sleep(delay=2)
             play_data = await self._api.play_slotmachine(spin_value=settings.VALUE_SPIN)
+            self.game.update(play_data.get('gameConfig'))
             reward_amount = play_data.get('spinResults', [{}])[0].get('rewardAmount', 0)
             reward_type = play_data.get('spinResults', [{}])[0].get('rewardType', 'NO')
             spins = play_data.get('gameConfig', {}).get('spinEnergyTotal', 0)
@@ -103,6 +152,7 @@ class Tapper:
                 self.log.info(f"🎟 ETH Lottery status: {eth_lottery_status} |"
                               f" 🎫 Ticket number: <yellow>{eth_lottery_ticket}</yellow>")
             await asyncio.sleep(delay=5)
+        self.state.casino_run_at = time()
 
 
     async def set_new_boss_level(self, level):
@@ -110,17 +160,45 @@ class Tapper:
         self.log.info(f"😴 Sleep 10s")
         await asyncio.sleep(delay=10)
 
-        status = await self._api.set_next_boss()
-        if status is True:
+        response = await self._api.set_next_boss()
+        if response and response.get('telegramGameSetNextBoss'):
+            self.game.update(response['telegramGameSetNextBoss'])
+            self.state.boss_level = level
             self.log.success(f"✅ Successful setting next boss: <m>{level}</m>")
 
+    async def show_linea_balance(self):
+        if not settings.LINEA_SHOW_BALANCE:
+            return
+        address = await self._api.get_linea_walled_address()
+        if not address:
+            return
+        balance = await self._api.get_linea_balance(address)
+        if balance is None:
+            return
+        eth = balance / 1e18
+        try:
+            usd = f" (<g>${eth * await linea.eth_price():,.2f}</g>)"
+        except Exception:
+            usd = ""
+        self.log.info(f"💎 Linea wallet <c>{address}</c> | Balance: <lc>{eth:.6f}</lc> ETH{usd}")
+
+    async def get_tapbot_config(self) -> dict:
+        ends_at = self.state.tapbot_ends_at
+        if ends_at and self._api.clock.until(ends_at) > 0:
+            return self.state.tapbot
+        config = await self._api.get_bot_config()
+        self.state.tapbot = config
+        return config
+
     async def get_web_data(self):
         if not self._web_data:
             await self.load_web_data()
         return self._web_data
 
     async def load_web_data(self):
-        self._web_data = await get_tg_web_data(self.tg_client)
+        # a restarted attempt of the session reuses the client while it is kept connected (TG_KEEP_CONNECTED)
+        self._web_data = await supervisor.step(self.tg_client.name, "web_data",
+                                               get_tg_web_data(self.tg_client, keep_connected=True))
         self.log.debug("Got")
         return self._web_data
 
@@ -163,9 +241,10 @@ class Tapper:
 
 
     async def run(self, proxy: str | None):
+        self.user_agent = await self.check_user_agent()
 
         if proxy:
-            ip = await check_proxy(proxy)
+            ip = await supervisor.step(self.tg_client.name, "proxy", check_proxy(proxy))
             if not ip:
                 return self.log.error("Proxy not available, skip session...")
             set_proxy_for_tg_client(self.tg_client, proxy)
@@ -173,40 +252,161 @@ class Tapper:
 
         await self.delay_before_start()
 
+        async with self.api_session(proxy):
+            await self.run_workflows()
+
+    @asynccontextmanager
+    async def api_session(self, proxy: str | None):
+        """Authorized MemeFiApi of the session, user agent and proxy of the Telegram client must be set."""
         if not self._web_data:
             await self.load_web_data()
 
+        # cloudscraper with js2py takes more than a half of startup import time
+        from aiocfscrape import CloudflareScraper
+
+        session_headers = dict(headers, **{'User-Agent': self.user_agent})
+        async with CloudflareScraper(headers=session_headers, connector=get_connector(proxy),
+                                     cookies=await clearance.cookies(proxy, self.user_agent)) as session:
+            self._api = MemeFiApi(session=session, proxy=proxy, account=self.tg_client.name,
+                                  max_concurrent=settings.ACCOUNT_CONCURRENCY)
+            await supervisor.step(self.tg_client.name, "login", self._api.auth_with_web_data(self._web_data))
+            await clearance.store(proxy, self.user_agent, session.cookie_jar)
+            yield self._api
+
+    async def run_workflows(self):
+        """Independent activities run concurrently, cycle time is the longest of them instead of the sum."""
+        # game actions change the account, each one runs only when enabled
+        enabled = {"report": True, "casino": settings.AUTO_CASINO, "boss": settings.AUTO_NEXT_BOSS,
+                   "tapbot": settings.AUTO_TAPBOT, "campaigns": settings.AUTO_CAMPAIGNS}
+        pending = [name for name, on in enabled.items() if on and name not in self.completed]
+        if "casino" in pending or "boss" in pending:
+            self.game.update(await self._api.get_profile_data())
+        workflows = {"report": self.report, "casino": lambda: self.roll_casino(self.game.spins),
+                     "boss": self.check_boss, "tapbot": self.run_tapbot, "campaigns": self.run_campaigns}
+        await asyncio.gather(*(self._once(name, workflows[name]) for name in pending))
+        if "casino" in pending:
+            # what is left for the next run decides how soon it gets a concurrency slot, see bot.utils.admission
+            self.state.spins = self.game.spins
+
+    async def _once(self, name: str, workflow: typing.Callable[[], typing.Awaitable]):
+        try:
+            await workflow()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            return self.log.opt(exception=e).error(f"Error in {name} workflow | {type(e).__name__}: {e}")
+        self.completed.add(name)
+
+    async def _workflow(self, name: str, coroutine: typing.Awaitable):
+        try:
+            return await coroutine
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.log.opt(exception=e).error(f"Error in {name} workflow | {type(e).__name__}: {e}")
+
+    async def report(self):
+        response = await self._api.airdrop_check()
+        for result in response:
+            data = result.get("data")
+            airdrop_to_do = data.get("airdropTodoTasks", {})
+            if airdrop_to_do:
+                await self.show_airdrop_checklist(airdrop_to_do)
+                continue
+            claim_wallet = data.get("airdropOkxOffChainClaimWalletConfig", {})
+
+            if claim_wallet and claim_wallet.get("wallet"):
+                wallet = claim_wallet.get("wallet")
+                okx_id = claim_wallet.get("okxId", "Not set")
+                self.log.info(f"Claim Airdrop Early via OKX. Wallet: </g>{wallet}</g>, OKX ID: {okx_id}")
+                continue
+            me = data.get("telegramUserMe", {})
+            if me:
+                await self.show_account_info(me)
+        await self.show_linea_balance()
+
+    async def check_boss(self):
+        boss = self.game.boss
+        if boss and boss.get("currentHealth") == 0:
+            await self.set_new_boss_level(boss.get("level", 0) + 1)
+
+    async def run_tapbot(self):
+        config = await self.get_tapbot_config()
+        if not config or not config.get("isPurchased"):
+            return
+        ends_at = parse_timestamp(config.get("endsAt"))
+        if ends_at and self._api.clock.until(ends_at) <= 0:
+            claimed = await self._api.claim_bot()
+            config = self.state.tapbot = claimed["data"]
+            self.log.success(f"🤖 TapBot claimed | Attempts: <le>{config.get('usedAttempts', 0)}"
+                             f"/{config.get('totalAttempts', 0)}</le>")
+        elif ends_at:
+            return
+        if config.get("usedAttempts", 0) < config.get("totalAttempts", 0):
+            config = await self._api.start_bot()
+            if config:
+                self.state.tapbot = config
+                self.log.success(f"🤖 TapBot started | Ends at: <c>{config.get('endsAt')}</c>")
+
+    async def run_campaigns(self):
+        if not settings.WATCH_VIDEO:
+            return
+        await video_codes.update_video_codes()
+        pending = 0
+        for campaign in await self._api.get_campaigns():
+            tasks = await self._api.get_tasks_list(campaign["id"])
+            # verification waits of the tasks overlap
+            completed = await asyncio.gather(*(self._workflow("campaign task", self.complete_campaign_task(task))
+                                               for task in tasks if task.get("status") != "Completed"))
+            pending += completed.count(None)
+        self.state.campaign_tasks_pending = pending
+
+    async def complete_campaign_task(self, task: dict):
+        if task.get("status") != "Verification":
+            task = await self._api.verify_campaign(task["id"])
+        available_at = parse_timestamp(task.get("verificationAvailableAt"))
+        wait = self._api.clock.until(available_at) if available_at else 0
+        if wait > 0:
+            await supervisor.sleep(self.tg_client.name, wait)
+        code = None
+        if task.get("taskVerificationType") == "SecretCode":
+            code = video_codes.get_video_code(task)
+            if not code:
+                return self.log.debug(f"No code for video <c>{task.get('name')}</c>")
+        try:
+            await self._api.complete_task(task["userTaskId"], code=code)
+        except MemeFiApiError as e:
+            # only a rejected code is a wrong one, timeouts and 5xx say nothing about it
+            if code and any("code" in message.lower() for message in e.messages):
+                video_codes.mark_code_as_incorrect(task, code)
+            raise
+        if code:
+            video_codes.mark_code_as_correct(task, code)
+        self.log.success(f"📺 Task <c>{task.get('name')}</c> completed (+{task.get('coinsRewardAmount', 0):,} coins)")
+        return True
+
+
+async def run_tapper(session_name: str, proxy: str | None):
+    session_logger = logger.opt(colors=True).bind(name=session_name)
+    tg_client = None
+    completed: set[str] = set()
+
+    async def attempt():
+        nonlocal tg_client
+        async with concurrency.slot(session_name, admission.score(state.account(session_name))):
+            supervisor.running(session_name)
+            # created with the first slot, kept for the restarts of the session
+            tg_client = tg_client or create_tg_client(session_name)
+            await Tapper(tg_client=tg_client, session_logger=session_logger, completed=completed).run(proxy=proxy)
 
-        async with CloudflareScraper(headers=headers, connector=get_connector(proxy)) as session:
-            self._api = MemeFiApi(session=session)
-            await self._api.auth_with_web_data(self._web_data)
-
-
-            response = await self._api.airdrop_check()
-            for result in response:
-                data = result.get("data")
-                airdrop_to_do = data.get("airdropTodoTasks", {})
-                if airdrop_to_do:
-                    await self.show_airdrop_checklist(airdrop_to_do)
-                    continue
-                claim_wallet = data.get("airdropOkxOffChainClaimWalletConfig", {})
-
-                if claim_wallet and claim_wallet.get("wallet"):
-                    wallet = claim_wallet.get("wallet")
-                    okx_id = claim_wallet.get("okxId", "Not set")
-                    self.log.info(f"Claim Airdrop Early via OKX. Wallet: </g>{wallet}</g>, OKX ID: {okx_id}")
-                    continue
-                me = data.get("telegramUserMe", {})
-                if me:
-                    await self.show_account_info(me)
-
-
-
-async def run_tapper(tg_client: Client, proxy: str | None):
-    session_logger = logger.opt(colors=True).bind(name=f"{tg_client.name}")
     try:
-        await Tapper(tg_client=tg_client, session_logger=session_logger).run(proxy=proxy)
-    except InvalidSession:
+        await supervisor.supervise(session_name, attempt,
+                                   permanent=(InvalidSession, TelegramInvalidSessionException, InvalidProtocol))
+    except (InvalidSession, TelegramInvalidSessionException) as error:
         session_logger.error(f"❗️Invalid Session")
+        await session_checks.mark_dead(session_name, f"{type(error).__name__}: {error}")
     except InvalidProtocol as error:
         session_logger.opt(exception=error).error(f"❗️Invalid protocol detected at {error}")
+    finally:
+        if tg_client is not None:
+            await tg_manager.release(tg_client)
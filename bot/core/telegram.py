@@ -1,4 +1,8 @@
+import asyncio
+import sqlite3
 import typing
+from contextlib import closing
+from time import monotonic
 from urllib.parse import parse_qs
 from better_proxy import Proxy
 
@@ -11,16 +15,25 @@ from pyrogram.errors import (
     UserDeactivatedBan,
     AuthKeyDuplicated,
     SessionRevoked,
-    SessionExpired
+    SessionExpired,
+    FloodWait
 )
 
+INVALID_SESSION_ERRORS = (Unauthorized, UserDeactivated, AuthKeyUnregistered, UserDeactivatedBan, AuthKeyDuplicated,
+                          SessionExpired, SessionRevoked)
+
+
 class TelegramInvalidSessionException(Exception):
     pass
 
 class TelegramProxyError(Exception):
     pass
 
+from bot.config import settings
+from bot.utils.concurrency import concurrency, classify_exception
 from bot.utils.logger import logger
+from bot.utils.supervisor import supervisor
+from bot.utils import metrics
 
 _log = logger.opt(colors=True).bind(name=__name__)
 
@@ -42,29 +55,149 @@ def set_proxy_for_tg_client(client: Client, proxy: typing.Union[Proxy, typing.Te
     client.proxy = proxy_dict
 
 
-async def get_tg_web_data(client: Client) -> dict:
-    is_already_connected = client.is_connected
-    try:
-        if not client.is_connected:
+def create_tg_client(session_name: str) -> Client:
+    return Client(
+        name=session_name,
+        api_id=settings.API_ID,
+        api_hash=settings.API_HASH,
+        workdir='sessions/',
+        plugins=dict(root='bot/plugins')
+    )
+
+
+class TelegramConnectionManager:
+    """
+    Caps concurrent MTProto handshakes and requests per DC, waits out FloodWait of a session
+    instead of failing it, and keeps clients that will be needed again soon connected.
+    Clients connected by their owner are left connected.
+    """
+
+    def __init__(self):
+        self._connects = asyncio.Semaphore(settings.TG_MAX_CONNECTS)
+        self._dc_slots: dict[int, asyncio.Semaphore] = {}
+        self._dc_ids: dict[str, int] = {}
+        self._idle_disconnects: dict[str, asyncio.TimerHandle] = {}
+        self._disconnecting: set[asyncio.Task] = set()
+
+    async def _dc_slot(self, client: Client) -> asyncio.Semaphore:
+        dc_id = self._dc_ids.get(client.name)
+        if dc_id is None:
+            dc_id = self._dc_ids[client.name] = await asyncio.to_thread(_session_dc_id, client)
+        slot = self._dc_slots.get(dc_id)
+        if slot is None:
+            slot = self._dc_slots[dc_id] = asyncio.Semaphore(settings.TG_PER_DC_CONCURRENCY)
+        return slot
+
+    async def _connect(self, client: Client):
+        if client.is_connected:
+            return
+        async with self._connects:
             await client.connect()
-        acc = await client.get_me()
-        _log.trace(f"TG Account Login: {acc.username} ({acc.first_name}) {acc.last_name})")
-
-        peer = await client.resolve_peer('memefi_coin_bot')
-        web_view = await client.invoke(RequestWebView(
-            peer=peer,
-            bot=peer,
-            platform='android',
-            from_bot_menu=False,
-            url="https://tg-app.memefi.club/game"
-        ))
-        return parse_qs(web_view.url)
-
-    except (Unauthorized, UserDeactivated, AuthKeyUnregistered, UserDeactivatedBan, AuthKeyDuplicated,
-            SessionExpired, SessionRevoked):
+
+    async def _disconnect(self, client: Client):
+        self._idle_disconnects.pop(client.name, None)
+        if client.is_connected:
+            await client.disconnect()
+
+    def _disconnect_idle(self, client: Client):
+        task = asyncio.ensure_future(self._disconnect(client))
+        self._disconnecting.add(task)
+        task.add_done_callback(self._disconnecting.discard)
+
+    def _keep_connected(self, client: Client):
+        if client.is_connected:
+            self._idle_disconnects[client.name] = asyncio.get_running_loop().call_later(
+                settings.TG_KEEP_CONNECTED, self._disconnect_idle, client)
+
+    async def release(self, client: Client):
+        """Disconnects a client kept connected by run(keep_connected=True) right away."""
+        handle = self._idle_disconnects.pop(client.name, None)
+        if handle:
+            handle.cancel()
+            await self._disconnect(client)
+
+    async def run(self, client: Client, method: typing.Callable[[Client], typing.Awaitable], keep_connected=False):
+        handle = self._idle_disconnects.pop(client.name, None)
+        if handle:
+            handle.cancel()
+        connected_by_owner = client.is_connected and handle is None
+        slot = await self._dc_slot(client)
+        try:
+            for attempt in range(settings.TG_FLOOD_WAIT_RETRIES + 1):
+                try:
+                    async with slot:
+                        await self._connect(client)
+                        return await method(client)
+                except FloodWait as e:
+                    if attempt == settings.TG_FLOOD_WAIT_RETRIES or e.value > settings.TG_MAX_FLOOD_WAIT:
+                        raise
+                    _log.warning(f"{client.name} | FloodWait, session is deferred for <y>{e.value}s</y>")
+                    # a planned wait: not a stall, and not counted against the deadline of the step
+                    await supervisor.sleep(client.name, e.value)
+        finally:
+            if connected_by_owner:
+                pass
+            elif keep_connected and settings.TG_KEEP_CONNECTED:
+                self._keep_connected(client)
+            else:
+                await self._disconnect(client)
+
+
+def _session_dc_id(client: Client) -> int:
+    database = getattr(client.storage, "database", None)
+    if not database:
+        return 0
+    try:
+        with closing(sqlite3.connect(f"file:{database}?mode=ro", uri=True)) as connection:
+            row = connection.execute("SELECT dc_id FROM sessions").fetchone()
+            return row[0] if row else 0
+    except sqlite3.Error:
+        return 0
+
+
+tg_manager = TelegramConnectionManager()
+
+
+async def get_tg_web_data(client: Client, keep_connected: bool = False) -> dict:
+    start = monotonic()
+    try:
+        web_data = await tg_manager.run(client, _get_tg_web_data, keep_connected=keep_connected)
+    except INVALID_SESSION_ERRORS:
+        metrics.telegram_latency.observe(monotonic() - start, outcome="invalid_session")
+        concurrency.record("telegram", monotonic() - start, "invalid_session")
         raise TelegramInvalidSessionException(f"Telegram session is invalid. Client: {client.name}")
     except AttributeError as e:
+        metrics.telegram_latency.observe(monotonic() - start, outcome="proxy_error")
+        concurrency.record("telegram", monotonic() - start, "proxy_error")
         raise TelegramProxyError(e)
-    finally:
-        if not is_already_connected and client.is_connected:
-            await client.disconnect()
\ No newline at end of file
+    except Exception as e:
+        outcome = classify_exception(e)
+        metrics.telegram_latency.observe(monotonic() - start, outcome=outcome)
+        concurrency.record("telegram", monotonic() - start, outcome)
+        raise
+    metrics.telegram_latency.observe(monotonic() - start, outcome="ok")
+    concurrency.record("telegram", monotonic() - start)
+    return web_data
+
+
+async def check_session_alive(client: Client):
+    """get_me through the connection manager, raises TelegramInvalidSessionException for dead sessions."""
+    try:
+        await tg_manager.run(client, lambda tg_client: tg_client.get_me())
+    except INVALID_SESSION_ERRORS as e:
+        raise TelegramInvalidSessionException(type(e).__name__)
+
+
+async def _get_tg_web_data(client: Client) -> dict:
+    acc = await client.get_me()
+    _log.trace(f"TG Account Login: {acc.username} ({acc.first_name}) {acc.last_name})")
+
+    peer = await client.resolve_peer('memefi_coin_bot')
+    web_view = await client.invoke(RequestWebView(
+        peer=peer,
+        bot=peer,
+        platform='android',
+        from_bot_menu=False,
+        url="https://tg-app.memefi.club/game"
+    ))
+    return parse_qs(web_view.url)
@@ -0,0 +1,30 @@
+from bot.config import settings
+from bot.core.memefi_api import MemeFiApi
+from bot.utils.server_clock import server_clock
+from bot.utils.state import AccountState
+
+
+def score(account: AccountState, now: float | None = None) -> float:
+    """
+    Expected reward per request of running the account now, from its state left by the last run:
+    TapBot to claim or to start, spin energy for the casino and video tasks left uncompleted.
+    Accounts never run before get the "unknown" weight.
+    """
+    weights = settings.ADMISSION_WEIGHTS
+    tapbot, spins, tasks = account.tapbot, account.spins, account.campaign_tasks_pending
+    if tapbot is None and spins is None and tasks is None:
+        return weights.get("unknown", 0)
+    # TapBot end is a server timestamp, local clock skew must not make it look ready too early or too late
+    now = server_clock(MemeFiApi._api_url).now() if now is None else now
+    value = 0.0
+    if settings.AUTO_TAPBOT and tapbot and tapbot.get("isPurchased"):
+        ends_at = account.tapbot_ends_at
+        if ends_at and ends_at <= now:
+            value += weights.get("tapbot_claim", 0)
+        elif not ends_at and tapbot.get("usedAttempts", 0) < tapbot.get("totalAttempts", 0):
+            value += weights.get("tapbot_start", 0)
+    if settings.AUTO_CASINO and settings.ROLL_CASINO and spins and spins > settings.VALUE_SPIN:
+        value += spins * weights.get("spin", 0)
+    if settings.AUTO_CAMPAIGNS and settings.WATCH_VIDEO and tasks:
+        value += tasks * weights.get("campaign_task", 0)
+    return value
@@ -0,0 +1,190 @@
+import asyncio
+import atexit
+import gzip
+import os
+from collections import defaultdict, deque
+from json import dumps, loads, JSONDecodeError
+from time import monotonic
+
+from aiohttp import ClientResponseError, RequestInfo
+from multidict import CIMultiDict, CIMultiDictProxy
+from yarl import URL
+
+from bot.config import settings
+from bot.utils.logger import logger
+
+_log = logger.opt(colors=True).bind(name=__name__)
+
+REDACTED = "<redacted>"
+SECRET_KEYS = {"hash", "query_id", "checkDataString", "access_token", "apikey", "signature", "user", "first_name",
+               "last_name", "username", "firstName", "lastName", "telegramId", "userId", "referralCode",
+               "walletAddress", "okxWallet", "okxSuiWallet", "okxTonWallet", "okxId", "binanceId"}
+# GraphQL documents are static and only bloat the cassette, the operation name identifies them
+DROPPED_KEYS = {"query"}
+KEPT_HEADERS = ("Content-Type", "Date", "Retry-After", "Server", "cf-mitigated")
+# entries are written as separate gzip members, a crash loses at most the unwritten ones
+MEMBER_ENTRIES = 100
+
+
+class CassetteMissError(Exception):
+    pass
+
+
+def redact(data):
+    if isinstance(data, dict):
+        return {key: REDACTED if key in SECRET_KEYS and value else redact(value)
+                for key, value in data.items() if key not in DROPPED_KEYS}
+    if isinstance(data, list):
+        return [redact(item) for item in data]
+    return data
+
+
+def _redact_body(body: bytes) -> str:
+    try:
+        return dumps(redact(loads(body)), ensure_ascii=False, separators=(",", ":"))
+    except (JSONDecodeError, UnicodeDecodeError):
+        return body.decode(errors="replace")
+
+
+class CassetteResponse:
+    """Minimal subset of aiohttp.ClientResponse used by MemeFiApi and VideoCodes."""
+
+    def __init__(self, url: str, status: int, headers: dict, body: str):
+        self.url = url
+        self.status = status
+        self.headers = CIMultiDictProxy(CIMultiDict(headers))
+        self._body = body.encode()
+
+    @property
+    def content_type(self) -> str:
+        return self.headers.get("Content-Type", "application/json").split(";")[0]
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            url = URL(self.url)
+            request_info = RequestInfo(url, "POST", CIMultiDictProxy(CIMultiDict()), url)
+            raise ClientResponseError(request_info, (), status=self.status, message="replayed", headers=self.headers)
+
+    async def read(self) -> bytes:
+        return self._body
+
+    async def text(self) -> str:
+        return self._body.decode()
+
+    async def json(self, content_type=None):
+        return loads(self._body)
+
+
+class Cassette:
+    """
+    Opt-in recorder of API traffic into gzip JSON-lines file with redacted secrets,
+    and replay of it in original timing or as fast as possible.
+    """
+
+    def __init__(self, mode: str, filename: str, timing: str):
+        self._file = None
+        self._buffer: list[str] = []
+        self.configure(mode, filename, timing)
+
+    def configure(self, mode: str, filename: str, timing: str):
+        self.close()
+        self.mode = mode
+        self.filename = filename
+        self.timing = timing
+        self._started = monotonic()
+        self._by_account: dict[tuple, deque] = defaultdict(deque)
+        self._by_operation: dict[tuple, deque] = defaultdict(deque)
+        self._loaded = False
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == "record"
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    def _writer(self):
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.filename) or ".", exist_ok=True)
+            self._file = open(self.filename, "ab")
+            atexit.register(self.close)
+            _log.info(f"Recording traffic to <c>{self.filename}</c>")
+        return self._file
+
+    def _flush(self):
+        if self._buffer:
+            self._file.write(gzip.compress("".join(self._buffer).encode()))
+            self._file.flush()
+            self._buffer.clear()
+
+    def close(self):
+        if self._file is not None:
+            self._flush()
+            self._file.close()
+            self._file = None
+
+    async def record(self, kind: str, url: str, account: str | None, operation: str | None,
+                     request_body: bytes | None, response, elapsed: float):
+        body = await response.read()
+        entry = {
+            "t": round(monotonic() - self._started - elapsed, 4),
+            "kind": kind,
+            "account": account,
+            "operation": operation,
+            "url": url.split("?")[0],
+            "request": _redact_body(request_body) if request_body else None,
+            "status": response.status,
+            "headers": {key: response.headers[key] for key in KEPT_HEADERS if key in response.headers},
+            "response": _redact_body(body),
+            "elapsed": round(elapsed, 4),
+        }
+        self._writer()
+        self._buffer.append(dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+        if len(self._buffer) >= MEMBER_ENTRIES:
+            self._flush()
+
+    def entries(self) -> list[dict]:
+        entries = []
+        try:
+            with gzip.open(self.filename, "rt", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entries.append(loads(line))
+        except (EOFError, gzip.BadGzipFile, JSONDecodeError):
+            # the recorder was killed while writing its last member
+            _log.warning(f"Cassette <c>{self.filename}</c> ends with an incomplete record, "
+                         f"{len(entries)} entries are used")
+        return entries
+
+    def _load(self):
+        for entry in self.entries():
+            key = (entry["kind"], entry["operation"] or entry["url"])
+            self._by_account[(entry["account"], *key)].append(entry)
+            self._by_operation[key].append(entry)
+        self._loaded = True
+        _log.info(f"Replaying traffic from <c>{self.filename}</c>")
+
+    @staticmethod
+    def _pop(queue: deque | None) -> dict | None:
+        # every entry is queued twice (by account and by operation) and must be served once
+        while queue:
+            entry = queue.popleft()
+            if not entry.get("served"):
+                entry["served"] = True
+                return entry
+        return None
+
+    async def play(self, kind: str, url: str, account: str | None, operation: str | None) -> CassetteResponse:
+        if not self._loaded:
+            self._load()
+        key = (kind, operation or url.split("?")[0])
+        entry = self._pop(self._by_account.get((account, *key))) or self._pop(self._by_operation.get(key))
+        if entry is None:
+            raise CassetteMissError(f"no recorded response for {key}")
+        if self.timing == "original":
+            await asyncio.sleep(entry["elapsed"])
+        return CassetteResponse(url, entry["status"], entry["headers"], entry["response"])
+
+
+cassette = Cassette(settings.CASSETTE_MODE, settings.CASSETTE_FILE, settings.CASSETTE_REPLAY_TIMING)
@@ -1,5 +1,6 @@
 import typing
 from asyncio import CancelledError
+from time import monotonic
 
 from aiohttp import ClientSession, ClientTimeout, ClientProxyConnectionError
 from better_proxy import Proxy
@@ -8,6 +9,8 @@ from python_socks import ProxyTimeoutError, ProxyError
 
 from bot.utils.connector import get_connector
 from bot.utils.logger import logger
+from bot.utils import metrics
+from bot.utils.rate_limiter import rate_limiter
 
 _log = logger.opt(colors=True).bind(name=__name__)
 
@@ -17,15 +20,26 @@ async def check_proxy(proxy: typing.Union[typing.Text, Proxy]) -> typing.Optiona
         proxy = Proxy.from_str(proxy)
     elif not isinstance(proxy, Proxy):
         raise ValueError("proxy must be type of Proxy or str")
+    url = 'https://api.ipify.org?format=json'
+    await rate_limiter.acquire(url, proxy=proxy.as_url)
+    outcome = "no_ip"
+    start = monotonic()
     async with ClientSession(connector=get_connector(proxy.as_url)) as session:
         try:
-            response = await session.get(url='https://api.ipify.org?format=json', timeout=ClientTimeout(5))
+            response = await session.get(url=url, timeout=ClientTimeout(5))
             data = await response.json()
             if data and data.get('ip'):
+                outcome = "ok"
                 return data.get('ip')
         except (ConnectionRefusedError, ClientProxyConnectionError, CancelledError, TimeoutError, ProxyTimeoutError):
+            outcome = "unavailable"
             _log.trace(f"Proxy not available")
         except ProxyError as e:
+            outcome = "proxy_error"
             _log.error(f"The proxy type may be incorrect! Error: {e}")
         except Exception as e:
+            outcome = "error"
             _log.opt(exception=e).error(f"Unknown error")
+        finally:
+            metrics.proxy_check_latency.observe(monotonic() - start, proxy=metrics.proxy_label(proxy.as_url),
+                                                outcome=outcome)
@@ -0,0 +1,122 @@
+import asyncio
+import hashlib
+import json
+from email.utils import parsedate_to_datetime
+from time import time
+
+from bot.config import settings
+from bot.utils.connector import get_connector
+from bot.utils.file_io import file_io
+from bot.utils.logger import logger
+from bot.utils.metrics import proxy_label
+
+_log = logger.opt(colors=True).bind(name=__name__)
+
+CLEARANCE_COOKIES = ("cf_clearance", "__cf_bm")
+
+
+def _expires(morsel) -> float:
+    if morsel["max-age"]:
+        return time() + int(morsel["max-age"])
+    if morsel["expires"]:
+        try:
+            return parsedate_to_datetime(morsel["expires"]).timestamp()
+        except (TypeError, ValueError):
+            pass
+    return time() + settings.CF_CLEARANCE_TTL
+
+
+class ClearanceCache:
+    """
+    Cloudflare clearance cookies per (proxy, user agent) with their expiry, persisted to CF_CLEARANCE_FILE.
+    Clearance is bound to IP and UA, so every session with the same pair reuses one solved challenge.
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self._entries: dict[str, dict] | None = None
+        self._locks: dict[str, asyncio.Lock] = {}
+
+    @staticmethod
+    def _key(proxy: str | None, user_agent: str) -> str:
+        # proxies with the same host may differ in credentials (and exit IP), the URL itself is not stored
+        if not proxy:
+            return f"direct|{user_agent}"
+        return f"{proxy_label(proxy)}#{hashlib.sha256(proxy.encode()).hexdigest()[:16]}|{user_agent}"
+
+    async def _load(self) -> dict[str, dict]:
+        if self._entries is None:
+            try:
+                entries = await file_io.read_json(self.filename, default={})
+            except json.JSONDecodeError:
+                _log.warning(f"Clearance cache <c>{self.filename}</c> is corrupted, starting empty")
+                entries = {}
+            if self._entries is None:
+                # entries of older versions were keyed by the full proxy URL
+                self._entries = {key: entry for key, entry in entries.items()
+                                 if key.startswith("direct|") or "#" in key.split("|", 1)[0]}
+        return self._entries
+
+    async def _save(self):
+        now = time()
+        entries = {key: entry for key, entry in (await self._load()).items() if entry["expires"] > now}
+        self._entries = entries
+        await file_io.write_json(self.filename, dict(entries))
+
+    async def _valid(self, proxy: str | None, user_agent: str) -> dict | None:
+        entry = (await self._load()).get(self._key(proxy, user_agent))
+        if entry and entry["expires"] > time():
+            return entry
+        return None
+
+    async def cookies(self, proxy: str | None, user_agent: str) -> dict[str, str]:
+        entry = await self._valid(proxy, user_agent)
+        return dict(entry["cookies"]) if entry else {}
+
+    async def store(self, proxy: str | None, user_agent: str, cookie_jar):
+        cookies, expires = {}, time() + settings.CF_CLEARANCE_TTL
+        for morsel in cookie_jar:
+            if morsel.key in CLEARANCE_COOKIES:
+                cookies[morsel.key] = morsel.value
+                expires = min(expires, _expires(morsel))
+        key = self._key(proxy, user_agent)
+        entries = await self._load()
+        entry = entries.get(key)
+        if entry and entry["cookies"] == cookies:
+            return
+        entries[key] = {"cookies": cookies, "expires": expires}
+        await self._save()
+
+    async def warm(self, url: str, proxy: str | None, headers: dict):
+        """Passes the challenge (if any) for the pair once, concurrent callers wait for the first one."""
+        user_agent = headers.get("User-Agent", "")
+        key = self._key(proxy, user_agent)
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            if await self._valid(proxy, user_agent):
+                return
+            from aiocfscrape import CloudflareScraper
+
+            async with CloudflareScraper(headers=headers, connector=get_connector(proxy)) as session:
+                try:
+                    async with session.get(url) as response:
+                        await response.read()
+                except Exception as e:
+                    _log.warning(f"Cloudflare warm up via {proxy or 'direct'} failed: {e}")
+                    return
+                await self.store(proxy, user_agent, session.cookie_jar)
+
+    async def warm_many(self, url: str, pairs: set[tuple[str | None, str]], headers: dict):
+        semaphore = asyncio.Semaphore(settings.CF_WARM_CONCURRENCY)
+
+        async def warm(proxy: str | None, user_agent: str):
+            async with semaphore:
+                await self.warm(url, proxy, dict(headers, **{"User-Agent": user_agent}))
+
+        pairs = {pair for pair in pairs if not await self._valid(*pair)}
+        if pairs:
+            _log.info(f"Warming up Cloudflare clearance for {len(pairs)} proxy/user agent pairs")
+            await asyncio.gather(*(warm(proxy, user_agent) for proxy, user_agent in pairs))
+
+
+clearance = ClearanceCache(settings.CF_CLEARANCE_FILE)
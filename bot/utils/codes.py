@@ -1,10 +1,13 @@
+import asyncio
+
 from aiohttp import ClientSession
-from asyncio import sleep
-from time import time
-from json import loads, dump
-from os import path
+from time import time, monotonic
+from json import loads
 
+from bot.utils.cassette import cassette
+from bot.utils.file_io import file_io
 from bot.utils.logger import logger
+from bot.utils.rate_limiter import rate_limiter
 
 
 
@@ -48,7 +51,9 @@ class VideoCodes:
     _last_update_timestamp: int = 0
     _last_update_from_external_codes_timestamp: float = 0
     _last_edit_timestamp_local_codes_file: float = 0
-    _checkpoint_need_update_local_file = False
+    # marks are written to the local file at most every _save_delay seconds and on exit
+    _save_delay = 10
+    _save_task: asyncio.Task | None = None
 
     @staticmethod
     def _get_codes_from_data(data: dict) -> CodesType:
@@ -62,8 +67,17 @@ class VideoCodes:
 
     async def _load_codes_from_url(self, url: str) -> CodesType:
         try:
+            await rate_limiter.acquire(url)
             async with ClientSession() as session:
-                request = await session.get(url=url, timeout=5)
+                if cassette.replaying:
+                    request = await cassette.play("http", url, None, None)
+                else:
+                    start = monotonic()
+                    request = await session.get(url=url, timeout=5)
+                    if cassette.recording:
+                        await cassette.record("http", url, None, None, None, request, monotonic() - start)
+                if request.status == 429:
+                    rate_limiter.throttle(url, None, request.headers.get("Retry-After"))
                 if request.status == 200:
                     response = await request.text()
                     codes_data = loads(response).get("codes", [])
@@ -75,11 +89,10 @@ class VideoCodes:
             logger.error(f"Error when try get codes: {e}", url)
         return {}
 
-    def get_codes_with_local_file(self, filename: str) -> CodesType:
-        with open(filename, "r") as f:
-            codes_data = loads(f.read()).get("codes", [])
-            logger.info(f"Loaded {len(codes_data)} codes from local file.")
-            return self._get_codes_from_data(codes_data)
+    async def get_codes_with_local_file(self, filename: str) -> CodesType:
+        codes_data = (await file_io.read_json(filename, default={})).get("codes", [])
+        logger.info(f"Loaded {len(codes_data)} codes from local file.")
+        return self._get_codes_from_data(codes_data)
 
     async def update_video_codes(self):
         codes_named = {}
@@ -89,9 +102,10 @@ class VideoCodes:
             for url in self.codes_urls:
                 codes_named.update((await self._load_codes_from_url(url)))
 
-        if self._last_edit_timestamp_local_codes_file != path.getmtime(self.filename):
-            self._last_edit_timestamp_local_codes_file = path.getmtime(self.filename)
-            codes_named.update(self.get_codes_with_local_file(self.filename))
+        mtime = await file_io.mtime(self.filename)
+        if mtime is not None and self._last_edit_timestamp_local_codes_file != mtime:
+            self._last_edit_timestamp_local_codes_file = mtime
+            codes_named.update(await self.get_codes_with_local_file(self.filename))
 
         count_updates = 0
         self._codes_id = {}
@@ -109,32 +123,38 @@ class VideoCodes:
             logger.debug(f"VideoCodes | Successful loaded {count_updates} video codes.")
             self._last_update_timestamp = int(time())
 
-    async def run_updater(self):
-        while True:
-            await self.update_video_codes()
-            if self._checkpoint_need_update_local_file and time() - self._checkpoint_need_update_local_file > 10:
-                self.update_local_file()
-            await sleep(1)
-
-
-    def update_local_file(self):
-        self._checkpoint_need_update_local_file = None
-        with open(self.filename, mode="w") as f:
-            dump({
-                "incorrect_codes": [code.dict(with_video_link=True) for code in self._incorrect_codes.values()],
-                "existing_codes": [code.dict(with_video_link=True) for code in self._existing_codes.values()],
-                "codes": [code.dict() for code in self._codes_name.values() if code.code]
-            }, f, indent=2, ensure_ascii=False)
-        self._last_edit_timestamp_local_codes_file = path.getmtime(self.filename)
-
-    def mark_code_as_incorrect(self, task: dict):
+    def _schedule_save(self):
+        if self._save_task is None or self._save_task.done():
+            self._save_task = asyncio.get_running_loop().create_task(self._save_later())
+
+    async def _save_later(self):
+        await asyncio.sleep(self._save_delay)
+        await self.update_local_file()
+
+    async def flush(self):
+        """Writes pending marks right away."""
+        if self._save_task is not None and not self._save_task.done():
+            self._save_task.cancel()
+            await self.update_local_file()
+
+    async def update_local_file(self):
+        await file_io.write_json(self.filename, {
+            "incorrect_codes": [code.dict(with_video_link=True) for code in self._incorrect_codes.values()],
+            "existing_codes": [code.dict(with_video_link=True) for code in self._existing_codes.values()],
+            "codes": [code.dict() for code in self._codes_name.values() if code.code]
+        }, indent=2, ensure_ascii=False)
+        self._last_edit_timestamp_local_codes_file = await file_io.mtime(self.filename)
+
+    def mark_code_as_incorrect(self, task: dict, code: str):
         video = Code(task)
-        video.code = self._codes_name.pop(video.name).code
+        video.code = code
+        # the code may have been matched by video id, not by name
+        self._codes_name.pop(video.name, None)
         logger.warning(f"VideoCodes | Mark code {video.code} as incorrect from video {video.name}")
         self._incorrect_codes[video.name] = video
         if video.id and video.id in self._codes_id:
             self._codes_id.pop(video.id)
-        self._checkpoint_need_update_local_file = time()
+        self._schedule_save()
 
     def mark_code_as_correct(self, task: dict, code):
         video = Code(task)
@@ -145,7 +165,7 @@ class VideoCodes:
             self._existing_codes.pop(video.id)
         else:
             return
-        self._checkpoint_need_update_local_file = time()
+        self._schedule_save()
 
 
     def get_video_code(self, task: dict) -> str | None:
@@ -160,11 +180,14 @@ class VideoCodes:
             if video.name in self._codes_name and self._codes_name[video.name].code:
                 return self._codes_name[video.name].code
             self._existing_codes.update({video.id: Code(task)})
-            self._checkpoint_need_update_local_file = time()
+            self._schedule_save()
         except Exception as e:
             logger.error(f"VideoCodesError: {e.__name__}: {e}")
 
 
 
     def get_last_update_timestamp(self) -> int:
-        return self._last_update_timestamp
\ No newline at end of file
+        return self._last_update_timestamp
+
+
+video_codes = VideoCodes()
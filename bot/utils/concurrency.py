@@ -0,0 +1,204 @@
+import asyncio
+import heapq
+from collections import deque
+from contextlib import asynccontextmanager
+from itertools import count
+from time import monotonic
+
+from bot.config import settings
+from bot.utils.logger import logger
+
+_log = logger.opt(colors=True).bind(name=__name__)
+
+CONGESTION_ERRORS = {"timeout", "server", "cloudflare", "throttled"}
+
+
+def classify_status(status: int, headers) -> str | None:
+    if status == 429:
+        return "throttled"
+    if status in (403, 503) and (headers.get("cf-mitigated") or "cloudflare" in headers.get("Server", "").lower()):
+        return "cloudflare"
+    if status >= 500:
+        return "server"
+    if status >= 400:
+        return "client"
+    return None
+
+
+def classify_exception(error: BaseException) -> str:
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError)):
+        return "timeout"
+    status = getattr(error, "status", None)
+    if isinstance(status, int):
+        return classify_status(status, getattr(error, "headers", None) or {}) or "client"
+    if type(error).__name__ == "FloodWait":
+        return "throttled"
+    return "network" if isinstance(error, OSError) else "other"
+
+
+class LatencyWindow:
+
+    def __init__(self, size: int = 500):
+        self._samples: deque[tuple[float, str | None]] = deque(maxlen=size)
+
+    def add(self, latency: float, error: str | None):
+        self._samples.append((latency, error))
+
+    def percentile(self, q: float) -> float:
+        if not self._samples:
+            return 0.0
+        latencies = sorted(latency for latency, _ in self._samples)
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+    def error_rate(self) -> float:
+        if not self._samples:
+            return 0.0
+        return sum(1 for _, error in self._samples if error in CONGESTION_ERRORS) / len(self._samples)
+
+    def __len__(self):
+        return len(self._samples)
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD limit of concurrently active accounts. The limit grows by one every adjust interval
+    while p95 latency and error rate of every source are healthy and the limit is actually used,
+    and is multiplied by CONCURRENCY_DECREASE_FACTOR on timeouts, 5xx, 429 and Cloudflare challenges.
+    """
+
+    def __init__(self):
+        self.min_limit, initial, self.max_limit = settings.CONCURRENCY_LIMITS
+        self.limit = initial
+        self._active = 0
+        # heap of [key, sequence, waiter], see acquire
+        self._waiters: list[list] = []
+        self._sequence = count()
+        # heap entries of named slots and names to serve first, see prioritise
+        self._named: dict[str, list] = {}
+        self._prioritised: set[str] = set()
+        self._windows: dict[str, LatencyWindow] = {}
+        self._last_increase = monotonic()
+        self._last_decrease = 0.0
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        return {
+            source: {"p50": window.percentile(0.5), "p95": window.percentile(0.95), "errors": window.error_rate()}
+            for source, window in self._windows.items()
+        }
+
+    def record(self, source: str, latency: float, error: str | None = None):
+        window = self._windows.get(source)
+        if window is None:
+            window = self._windows[source] = LatencyWindow()
+        window.add(latency, error)
+        now = monotonic()
+        if error in CONGESTION_ERRORS:
+            if now - self._last_decrease >= settings.CONCURRENCY_ADJUST_INTERVAL:
+                self._set_limit(int(self.limit * settings.CONCURRENCY_DECREASE_FACTOR), f"{source} {error}")
+                self._last_decrease = self._last_increase = now
+        elif now - self._last_increase >= settings.CONCURRENCY_ADJUST_INTERVAL:
+            self._last_increase = now
+            if self._active >= self.limit and self._is_healthy():
+                self._set_limit(self.limit + 1)
+
+    def _is_healthy(self) -> bool:
+        for source, window in self._windows.items():
+            target = settings.CONCURRENCY_TARGET_P95.get(source)
+            if target and window.percentile(0.95) > target:
+                return False
+            if window.error_rate() > settings.CONCURRENCY_MAX_ERROR_RATE:
+                return False
+        return True
+
+    def _set_limit(self, limit: int, reason: str | None = None):
+        limit = max(self.min_limit, min(self.max_limit, limit))
+        if limit == self.limit:
+            return
+        if reason:
+            _log.info(f"Concurrency decreased <r>{self.limit}</r> -> <y>{limit}</y> ({reason})")
+        else:
+            _log.debug(f"Concurrency increased {self.limit} -> {limit}")
+        self.limit = limit
+        self._wake_up()
+
+    def set_limit(self, limit: int):
+        self._set_limit(limit)
+
+    def set_bounds(self, min_limit: int | None = None, max_limit: int | None = None):
+        min_limit = self.min_limit if min_limit is None else min_limit
+        max_limit = self.max_limit if max_limit is None else max_limit
+        if not 1 <= min_limit <= max_limit:
+            raise ValueError(f"invalid concurrency bounds [{min_limit}, {max_limit}]")
+        self.min_limit, self.max_limit = min_limit, max_limit
+        self._set_limit(self.limit)
+
+    def prioritise(self, name: str):
+        """The named slot is served before the others, now if it waits already or when it is requested."""
+        entry = self._named.get(name)
+        if entry is None or entry[2].done():
+            self._prioritised.add(name)
+            return
+        # the old entry stays in the heap without its waiter and is skipped
+        self._named[name] = self._push(float("-inf"), entry[2])
+        entry[2] = None
+
+    def _push(self, key: float, waiter: asyncio.Future) -> list:
+        entry = [key, next(self._sequence), waiter]
+        heapq.heappush(self._waiters, entry)
+        return entry
+
+    def _wake_up(self):
+        while self._waiters and self._active < self.limit:
+            waiter = heapq.heappop(self._waiters)[2]
+            if waiter is not None and not waiter.done():
+                self._active += 1
+                waiter.set_result(None)
+
+    async def acquire(self, name: str | None = None, score: float = 0.0):
+        """
+        Waiters with a higher admission score are served first. The score of a waiter grows by
+        ADMISSION_AGING per minute of waiting, so low valued ones are not starved.
+        """
+        priority = name in self._prioritised
+        self._prioritised.discard(name)
+        if self._active < self.limit and not self._waiters:
+            self._active += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        # score + aging * waited is ordered the same as score - aging * enqueued, which does not change in time
+        key = float("-inf") if priority else monotonic() * settings.ADMISSION_AGING / 60 - score
+        entry = self._push(key, waiter)
+        if name is not None:
+            self._named[name] = entry
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            named = self._named.get(name)
+            if named is not None and named[2] is waiter:
+                del self._named[name]
+
+    def release(self):
+        self._active -= 1
+        self._wake_up()
+
+    @asynccontextmanager
+    async def slot(self, name: str | None = None, score: float = 0.0):
+        if not settings.ADAPTIVE_CONCURRENCY:
+            yield
+            return
+        await self.acquire(name, score)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+concurrency = AdaptiveConcurrency()
@@ -0,0 +1,150 @@
+from typing import TYPE_CHECKING
+
+from aiohttp import web
+
+from bot.config import settings
+from bot.utils.concurrency import concurrency
+from bot.utils.logger import logger
+from bot.utils.metrics import proxy_label
+from bot.utils.rate_limiter import rate_limiter
+from bot.utils.supervisor import supervisor
+
+if TYPE_CHECKING:
+    from bot.utils.launcher import FleetManager
+
+_log = logger.opt(colors=True).bind(name=__name__)
+
+
+class ControlPlane:
+    """
+    Local HTTP API over the running fleet:
+
+        GET  /sessions                       sessions with health, step, next wake time, proxy and last error
+        GET  /sessions/{name}
+        POST /sessions/{name}/pause          stops the session before its next step
+        POST /sessions/{name}/resume
+        POST /sessions/{name}/prioritise     ends its restart backoff, gives it the next concurrency slot
+        GET  /concurrency
+        POST /concurrency                    {"limit": 50, "min": 5, "max": 200}
+        GET  /rate-limits
+        POST /rate-limits                    {"scope": "host" | "proxy" | "account" | "operation",
+                                              "name": "...", "budget": [rate, burst]} or {"enabled": false}
+    """
+
+    def __init__(self, fleet: "FleetManager"):
+        self.fleet = fleet
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self._authorize])
+        app.router.add_get("/sessions", self.list_sessions)
+        app.router.add_get("/sessions/{name}", self.get_session)
+        app.router.add_post("/sessions/{name}/{action:pause|resume|prioritise}", self.session_action)
+        app.router.add_get("/concurrency", self.get_concurrency)
+        app.router.add_post("/concurrency", self.set_concurrency)
+        app.router.add_get("/rate-limits", self.get_rate_limits)
+        app.router.add_post("/rate-limits", self.set_rate_limits)
+        return app
+
+    @staticmethod
+    @web.middleware
+    async def _authorize(request: web.Request, handler):
+        if settings.CONTROL_TOKEN and request.headers.get("Authorization") != f"Bearer {settings.CONTROL_TOKEN}":
+            raise web.HTTPUnauthorized()
+        return await handler(request)
+
+    def _sessions(self) -> dict[str, dict]:
+        # finished sessions are known only to the supervisor, their proxy is released
+        proxies = self.fleet.sessions()
+        return {name: dict(health, proxy=proxy_label(proxies.get(name)))
+                for name, health in supervisor.snapshot().items()}
+
+    async def list_sessions(self, _: web.Request) -> web.Response:
+        return web.json_response(self._sessions())
+
+    async def get_session(self, request: web.Request) -> web.Response:
+        session = self._sessions().get(request.match_info["name"])
+        if session is None:
+            raise web.HTTPNotFound()
+        return web.json_response(session)
+
+    async def session_action(self, request: web.Request) -> web.Response:
+        name, action = request.match_info["name"], request.match_info["action"]
+        if not getattr(supervisor, action)(name):
+            raise web.HTTPConflict(text=f"{name} can not be {action}d")
+        return web.json_response(self._sessions().get(name, {}))
+
+    @staticmethod
+    def _concurrency() -> dict:
+        return {"adaptive": settings.ADAPTIVE_CONCURRENCY, "limit": concurrency.limit, "active": concurrency.active,
+                "min": concurrency.min_limit, "max": concurrency.max_limit, "stats": concurrency.stats()}
+
+    async def get_concurrency(self, _: web.Request) -> web.Response:
+        return web.json_response(self._concurrency())
+
+    async def set_concurrency(self, request: web.Request) -> web.Response:
+        data = await self._json(request)
+        # everything is checked before any of it is applied, a rejected request changes nothing
+        try:
+            min_limit = int(data.get("min", concurrency.min_limit))
+            max_limit = int(data.get("max", concurrency.max_limit))
+            limit = int(data["limit"]) if data.get("limit") is not None else None
+        except (TypeError, ValueError) as e:
+            raise web.HTTPBadRequest(text=f"invalid concurrency: {e}")
+        if not 1 <= min_limit <= max_limit:
+            raise web.HTTPBadRequest(text=f"invalid concurrency bounds [{min_limit}, {max_limit}], "
+                                          f"1 <= min <= max is required")
+        if limit is not None and not min_limit <= limit <= max_limit:
+            raise web.HTTPBadRequest(text=f"concurrency limit {limit} is out of [{min_limit}, {max_limit}]")
+        concurrency.set_bounds(min_limit=min_limit, max_limit=max_limit)
+        if limit is not None:
+            concurrency.set_limit(limit)
+        _log.info(f"Concurrency set to <y>{concurrency.limit}</y> "
+                  f"[{concurrency.min_limit}, {concurrency.max_limit}] via control API")
+        return web.json_response(self._concurrency())
+
+    async def get_rate_limits(self, _: web.Request) -> web.Response:
+        return web.json_response(rate_limiter.budgets())
+
+    async def set_rate_limits(self, request: web.Request) -> web.Response:
+        data = await self._json(request)
+        if "scope" in data:
+            try:
+                budget = [float(value) for value in data["budget"]]
+                rate, burst = budget
+            except (KeyError, TypeError, ValueError) as e:
+                raise web.HTTPBadRequest(text=f"invalid rate limit: {e}")
+            # a bucket with no rate never refills and one with burst below a token never lets a request through
+            if not (0 < rate < float("inf") and 1 <= burst < float("inf")):
+                raise web.HTTPBadRequest(text=f"invalid rate limit {budget}, rate > 0 and burst >= 1 are required")
+            try:
+                rate_limiter.set_budget(data["scope"], budget, data.get("name"))
+            except ValueError as e:
+                raise web.HTTPBadRequest(text=f"invalid rate limit: {e}")
+        if "enabled" in data:
+            settings.RATE_LIMIT = bool(data["enabled"])
+        _log.info(f"Rate limits changed via control API: {data}")
+        return web.json_response(rate_limiter.budgets())
+
+    @staticmethod
+    async def _json(request: web.Request) -> dict:
+        try:
+            data = await request.json()
+        except ValueError:
+            raise web.HTTPBadRequest(text="JSON body expected")
+        if not isinstance(data, dict):
+            raise web.HTTPBadRequest(text="JSON object expected")
+        return data
+
+
+async def start_control_server(fleet: "FleetManager") -> web.AppRunner | None:
+    if not settings.CONTROL:
+        return None
+    runner = web.AppRunner(ControlPlane(fleet).app(), access_log=None)
+    await runner.setup()
+    if settings.CONTROL_SOCKET:
+        await web.UnixSite(runner, settings.CONTROL_SOCKET).start()
+        _log.info(f"Control API available on unix socket <c>{settings.CONTROL_SOCKET}</c>")
+    else:
+        await web.TCPSite(runner, host=settings.CONTROL_HOST, port=settings.CONTROL_PORT).start()
+        _log.info(f"Control API available on <c>http://{settings.CONTROL_HOST}:{settings.CONTROL_PORT}</c>")
+    return runner
@@ -0,0 +1,148 @@
+import asyncio
+import os
+import signal
+import sys
+import threading
+from collections import Counter
+from time import monotonic, perf_counter, sleep, strftime
+from typing import Callable
+
+from bot.config import settings
+from bot.utils.logger import logger
+from bot.utils import metrics
+
+_log = logger.opt(colors=True).bind(name=__name__)
+
+loop_lag = metrics.registry.register(metrics.Histogram(
+    "event_loop_lag_seconds", "Delay of event loop wake-ups.", buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)))
+slow_callbacks = metrics.registry.register(metrics.Counter(
+    "event_loop_slow_callbacks_total", "Callbacks that blocked the event loop longer than SLOW_CALLBACK_MS."))
+
+
+def describe_handle(handle: asyncio.Handle) -> str:
+    """Coroutine (with current line) or function that is behind the loop callback."""
+    callback = getattr(handle, "_callback", None)
+    task = getattr(callback, "__self__", None)
+    if isinstance(task, asyncio.Task):
+        coro = task.get_coro()
+        frame = getattr(coro, "cr_frame", None)
+        location = f" at {frame.f_code.co_filename}:{frame.f_lineno}" if frame else ""
+        return f"{task.get_name()} {getattr(coro, '__qualname__', coro)}{location}"
+    code = getattr(callback, "__code__", None)
+    if code:
+        return f"{getattr(callback, '__qualname__', callback)} at {code.co_filename}:{code.co_firstlineno}"
+    return repr(handle)
+
+
+_original_handle_run: Callable | None = None
+_monitor: asyncio.Task | None = None
+
+
+def _patch_handle_run():
+    """Times every loop callback; applied once per process, undone by _restore_handle_run."""
+    global _original_handle_run
+    if _original_handle_run is not None:
+        return
+    original_run = _original_handle_run = asyncio.events.Handle._run
+    threshold = settings.SLOW_CALLBACK_MS / 1000
+
+    def _run(self):
+        start = perf_counter()
+        original_run(self)
+        duration = perf_counter() - start
+        if duration > threshold:
+            slow_callbacks.inc()
+            _log.warning("Slow callback <r>{:.0f}ms</r> | {}", duration * 1000, describe_handle(self))
+
+    asyncio.events.Handle._run = _run
+
+
+def _restore_handle_run():
+    global _original_handle_run
+    if _original_handle_run is not None:
+        asyncio.events.Handle._run = _original_handle_run
+        _original_handle_run = None
+
+
+async def monitor_loop_lag():
+    interval = settings.LOOP_LAG_INTERVAL
+    while True:
+        start = monotonic()
+        await asyncio.sleep(interval)
+        lag = monotonic() - start - interval
+        loop_lag.observe(lag)
+        if lag > settings.SLOW_CALLBACK_MS / 1000:
+            _log.warning(f"Event loop lag <r>{lag * 1000:.0f}ms</r>")
+
+
+class SamplingProfiler:
+    """Samples stack of the event loop thread from a separate thread and writes collapsed stacks (flame graph input)."""
+
+    def __init__(self, thread_id: int):
+        self._thread_id = thread_id
+        self._running = False
+
+    def _collect(self, duration: float, interval: float) -> Counter:
+        stacks = Counter()
+        end = monotonic() + duration
+        while monotonic() < end:
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                stacks[";".join(reversed(stack))] += 1
+            sleep(interval)
+        return stacks
+
+    def _run(self, duration: float, interval: float):
+        try:
+            stacks = self._collect(duration, interval)
+            os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+            filename = os.path.join(settings.PROFILE_DIR, f"profile-{strftime('%Y%m%d-%H%M%S')}.collapsed")
+            with open(filename, "w") as f:
+                f.writelines(f"{stack} {count}\n" for stack, count in stacks.most_common())
+            _log.info("Profile with {} samples saved to <c>{}</c>", sum(stacks.values()), filename)
+        finally:
+            self._running = False
+
+    def start(self):
+        if self._running:
+            return _log.warning("Profiler is already running")
+        self._running = True
+        _log.info(f"Profiling event loop for <y>{settings.PROFILE_DURATION}s</y>")
+        threading.Thread(target=self._run, name="profiler", daemon=True,
+                         args=(settings.PROFILE_DURATION, settings.PROFILE_INTERVAL_MS / 1000)).start()
+
+
+async def _diagnose(loop: asyncio.AbstractEventLoop):
+    try:
+        await monitor_loop_lag()
+    finally:
+        _restore_handle_run()
+        if hasattr(signal, "SIGUSR1"):
+            loop.remove_signal_handler(signal.SIGUSR1)
+
+
+def install() -> asyncio.Task | None:
+    """
+    Enables diagnostics mode for running loop. Profile is dumped on SIGUSR1.
+    Cancelling the returned task disables it again, a repeated call returns the running one.
+    """
+    global _monitor
+    if not settings.DIAGNOSTICS:
+        return None
+    if _monitor is not None and not _monitor.done():
+        return _monitor
+    loop = asyncio.get_running_loop()
+    _patch_handle_run()
+    profiler = SamplingProfiler(threading.get_ident())
+    if hasattr(signal, "SIGUSR1"):
+        loop.add_signal_handler(signal.SIGUSR1, profiler.start)
+        _log.info(f"Diagnostics enabled. Send SIGUSR1 to pid <c>{os.getpid()}</c> to dump profile")
+    else:
+        _log.warning("Diagnostics enabled, profile dump on signal is not supported on this platform")
+    _monitor = asyncio.create_task(_diagnose(loop))
+    return _monitor
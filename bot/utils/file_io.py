@@ -0,0 +1,91 @@
+import asyncio
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+
+def atomic_write(filename: str, text: str):
+    """Writes to a temporary file next to the target and renames it, readers never see a partial file."""
+    tmp = f"{filename}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, filename)
+
+
+class FileIO:
+    """
+    File operations on one dedicated thread. Writes are atomic and coalesced: while a write of a file
+    waits for the thread, newer content replaces it and all writers are resolved by the single write.
+    Data passed to write_json is serialized on the thread, it must not be mutated afterwards.
+    """
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="file-io")
+        self._lock = threading.Lock()
+        self._pending: dict[str, Callable[[], str]] = {}
+        self._writes: dict[str, asyncio.Future] = {}
+
+    async def _run(self, func: Callable, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    @staticmethod
+    def _read_text(filename: str) -> str | None:
+        try:
+            with open(filename, encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _mtime(filename: str) -> float | None:
+        try:
+            return os.path.getmtime(filename)
+        except FileNotFoundError:
+            return None
+
+    async def read_text(self, filename: str) -> str | None:
+        return await self._run(self._read_text, filename)
+
+    async def read_json(self, filename: str, default: Any = None) -> Any:
+        def read():
+            text = self._read_text(filename)
+            return default if text is None else json.loads(text)
+        return await self._run(read)
+
+    async def mtime(self, filename: str) -> float | None:
+        return await self._run(self._mtime, filename)
+
+    def _flush(self, filename: str):
+        with self._lock:
+            render = self._pending.pop(filename)
+            self._writes.pop(filename, None)
+        atomic_write(filename, render())
+
+    async def _write(self, filename: str, render: Callable[[], str]):
+        with self._lock:
+            self._pending[filename] = render
+            future = self._writes.get(filename)
+            if future is None:
+                future = self._writes[filename] = asyncio.get_running_loop().run_in_executor(
+                    self._executor, self._flush, filename)
+        await asyncio.shield(future)
+
+    async def write_text(self, filename: str, text: str):
+        await self._write(filename, lambda: text)
+
+    async def write_json(self, filename: str, data: Any, **dump_kwargs):
+        await self._write(filename, lambda: json.dumps(data, **dump_kwargs))
+
+    @staticmethod
+    def _append_text(filename: str, text: str):
+        with open(filename, "a", encoding="utf-8", newline="") as f:
+            f.write(text)
+
+    async def append_text(self, filename: str, text: str):
+        """Appends in call order, for streamed output; not coalesced, not atomic."""
+        await self._run(self._append_text, filename, text)
+
+
+file_io = FileIO()
@@ -1,22 +1,18 @@
 import os
 import glob
+import json
+import sqlite3
+import typing
 import asyncio
 import argparse
 from asyncio import sleep
-from itertools import cycle
-
-import platform
-import sys
-
-from pyrogram import Client
-from better_proxy import Proxy
+from time import monotonic
 
 from bot.config import settings
 from bot.utils import logger
-from bot.core.tapper import run_tapper
-from bot.core.registrator import register_sessions
-from bot.utils.codes import VideoCodes
+from bot.utils.leases import create_leases
 
+# pyrogram, tapper (cloudscraper, js2py) and the rest of heavy modules are imported only by the action that needs them
 start_text = """
                                
 ███╗   ███╗███████╗███╗   ███╗███████╗███████╗██╗██████╗  ██████╗ ████████╗
@@ -30,6 +26,7 @@ Select an action:
 
     1. Run bot
     2. Create session
+    3. Fleet report (read-only)
 """
 
 
@@ -41,6 +38,8 @@ def get_session_names() -> list[str]:
 
 
 def get_proxies() -> list[str]:
+    from better_proxy import Proxy
+
     proxies = []
     if settings.USE_PROXY_FROM_FILE:
         with open(file='bot/config/proxies.txt', encoding='utf-8-sig') as file:
@@ -51,7 +50,7 @@ def get_proxies() -> list[str]:
     return proxies
 
 
-async def get_tg_clients() -> list[Client]:
+def check_sessions() -> list[str]:
     session_names = get_session_names()
 
     if not session_names:
@@ -60,15 +59,7 @@ async def get_tg_clients() -> list[Client]:
     if not settings.API_ID or not settings.API_HASH:
         raise ValueError("API_ID and API_HASH not found in the .env file.")
 
-    tg_clients = [Client(
-        name=session_name,
-        api_id=settings.API_ID,
-        api_hash=settings.API_HASH,
-        workdir='sessions/',
-        plugins=dict(root='bot/plugins')
-    ) for session_name in session_names]
-
-    return tg_clients
+    return session_names
 
 
 async def process() -> None:
@@ -86,8 +77,8 @@ async def process() -> None:
 
             if not action.isdigit():
                 logger.warning("Action must be number")
-            elif action not in ['1', '2']:
-                logger.warning("Action must be 1 or 2")
+            elif action not in ['1', '2', '3']:
+                logger.warning("Action must be 1, 2 or 3")
             else:
                 action = int(action)
                 break
@@ -102,19 +93,279 @@ async def process() -> None:
     logger.info(f"Detected {len(get_session_names())} sessions | {len(get_proxies())} proxies")
 
     if action == 1:
-        tg_clients = await get_tg_clients()
-        await run_tasks(tg_clients=tg_clients)
+        from bot.utils.metrics import start_metrics_server
+        from bot.utils import diagnostics
+
+        await start_metrics_server()
+        lag_monitor = diagnostics.install()
+        check_sessions()
+        try:
+            await run_tasks()
+        finally:
+            if lag_monitor is not None:
+                lag_monitor.cancel()
     elif action == 2:
+        from bot.core.registrator import register_sessions
+
         await register_sessions()
+    elif action == 3:
+        from bot.core.report import run_report
+
+        await run_report(check_sessions(), get_proxies())
+
+
+class FleetManager:
+    """
+    Runs a tapper task per session and watches the sessions directory and the proxies file:
+    new sessions are started, removed ones cancelled and sessions which proxy was removed
+    are rebound to the least used one, the rest of the fleet is not touched.
+    """
+
+    def __init__(self):
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._session_keys: dict[str, str] = {}
+        self._bindings: dict[str, str | None] = {}
+        self._proxies: list[str] = []
+        self._proxies_mtime: float | None = -1.0
+        self._leases = create_leases()
+        # the watcher and the lease coordinator both reconcile, a session must not be started twice
+        self._reconciling = asyncio.Lock()
+
+    @staticmethod
+    def _mtime(path: str) -> float | None:
+        try:
+            return os.stat(path).st_mtime
+        except FileNotFoundError:
+            return None
+
+    def sessions(self) -> dict[str, str | None]:
+        """Running sessions and their proxies."""
+        return {name: self._bindings.get(name) for name in self._tasks}
+
+    def _next_proxy(self) -> str | None:
+        if not self._proxies:
+            return None
+        usage = {proxy: 0 for proxy in self._proxies}
+        for proxy in self._bindings.values():
+            if proxy in usage:
+                usage[proxy] += 1
+        return min(self._proxies, key=usage.__getitem__)
+
+    def _start(self, session_name: str):
+        from bot.core.tapper import run_tapper
+
+        if session_name not in self._bindings:
+            self._bindings[session_name] = self._next_proxy()
+        proxy = self._bindings[session_name]
+        # pyrogram Client is created by run_tapper only when the session gets a concurrency slot
+        task = asyncio.create_task(run_tapper(session_name=session_name, proxy=proxy), name=session_name)
+        task.add_done_callback(self._on_done)
+        self._tasks[session_name] = task
+
+    async def _start_many(self, session_names: list[str]):
+        for session_name in session_names:
+            if session_name not in self._bindings:
+                self._bindings[session_name] = self._next_proxy()
+        if settings.CF_PREWARM:
+            await self._warm_up(session_names)
+        for session_name in session_names:
+            self._start(session_name)
+
+    async def _warm_up(self, session_names: list[str]):
+        """Solves Cloudflare challenge once per (proxy, user agent) before the sessions fan out."""
+        from bot.config.config import USER_AGENTS_FILE
+        from bot.core.headers import headers
+        from bot.core.memefi_api import MemeFiApi
+        from bot.utils.cloudflare import clearance
+        from bot.utils.file_io import file_io
+
+        try:
+            agents = {session['session_name']: session['user_agent']
+                      for session in await file_io.read_json(USER_AGENTS_FILE, default=[])}
+        except json.JSONDecodeError:
+            return
+        pairs = {(self._bindings.get(name), agents[name]) for name in session_names if name in agents}
+        await clearance.warm_many(MemeFiApi._api_url, pairs, headers)
+
+    def _on_done(self, task: asyncio.Task):
+        if self._tasks.get(task.get_name()) is task:
+            del self._tasks[task.get_name()]
+            self._bindings.pop(task.get_name(), None)
+        if not task.cancelled() and task.exception():
+            logger.opt(exception=task.exception()).error(f"{task.get_name()} | Session task failed")
+
+    def _stop(self, session_name: str):
+        task = self._tasks.pop(session_name, None)
+        self._bindings.pop(session_name, None)
+        if task:
+            task.cancel()
+        else:
+            from bot.utils.supervisor import supervisor
+
+            supervisor.forget(session_name)
+        return task
+
+    async def _stop_and_wait(self, session_names: typing.Iterable[str]):
+        """Stops sessions and waits until they have disconnected, only then their session files may be reused."""
+        await asyncio.gather(*[task for task in map(self._stop, list(session_names)) if task],
+                             return_exceptions=True)
+
+    async def _release(self, session_names: typing.Iterable[str]):
+        """Stops sessions this node no longer runs, they are started as new ones if they come back."""
+        session_names = list(session_names)
+        await self._stop_and_wait(session_names)
+        for session_name in session_names:
+            self._session_keys.pop(session_name, None)
+
+    def _reload_proxies(self) -> bool:
+        mtime = self._mtime('bot/config/proxies.txt') if settings.USE_PROXY_FROM_FILE else None
+        if mtime == self._proxies_mtime:
+            return False
+        self._proxies_mtime = mtime
+        proxies = get_proxies() if mtime is not None else []
+        changed = proxies != self._proxies
+        self._proxies = proxies
+        return changed
+
+    async def _reconcile_sessions(self):
+        async with self._reconciling:
+            await self._reconcile_session_files()
+
+    async def _reconcile_session_files(self):
+        from bot.utils.session_check import session_checks
+
+        session_names = get_session_names()
+        if self._leases:
+            session_names = [name for name in session_names if name in self._leases.owned]
+        mtimes = {name: self._mtime(f'sessions/{name}.session') for name in session_names}
+        idle = [name for name in session_names if name not in self._tasks]
+        # liveness goes through the proxy the session is going to run with
+        for session_name in idle:
+            if session_name not in self._bindings:
+                self._bindings[session_name] = self._next_proxy()
+        # only viable sessions are scheduled, keyed by auth key: pyrogram itself keeps writing to session files;
+        # running sessions are not checked for liveness, that would open their session file with a second client
+        keys = await session_checks.check(mtimes, self._bindings.get, running=set(self._tasks))
+        removed = set(self._session_keys) - set(keys)
+        for session_name in removed:
+            logger.info(f"{session_name} | Session file removed, invalid or lease lost, stopping")
+        # a new or replaced session file, finished (e.g. invalid) sessions are started again only in this case
+        starting = [name for name, key in keys.items() if self._session_keys.get(name) != key]
+        replaced = [name for name in starting if name in self._session_keys]
+        for session_name in replaced:
+            logger.info(f"{session_name} | Session file replaced, restarting")
+        await self._release([*removed, *replaced])
+        if self._leases:
+            # leases may have been given up while the sessions were checked
+            starting = [name for name in starting if name in self._leases.owned]
+        for session_name in set(idle) - set(starting) - set(self._tasks):
+            self._bindings.pop(session_name, None)
+        for session_name in starting:
+            self._session_keys[session_name] = keys[session_name]
+        await self._start_many(starting)
+
+    async def _reconcile_proxies(self):
+        async with self._reconciling:
+            await self._rebind_proxies()
+
+    async def _rebind_proxies(self):
+        unbound = [name for name, proxy in self._bindings.items()
+                   if proxy not in self._proxies and (proxy is not None or self._proxies)]
+        for session_name in unbound:
+            logger.info(f"{session_name} | Proxy removed, restarting with another one")
+        await self._stop_and_wait(unbound)
+        await self._start_many(unbound)
+
+    async def _rebalance(self):
+        """Renews leases of this node, hands sessions above its share over and claims free ones."""
+        leases = self._leases
+        session_names = get_session_names()
+        try:
+            lost, excess = await leases.renew(len(session_names))
+            if lost:
+                logger.warning(f"{len(lost)} session leases were taken over by other nodes, stopping them")
+                await self._release(lost)
+            if excess:
+                logger.info(f"Handing {len(excess)} sessions over to other nodes")
+                await self._release(excess)
+                await leases.release(excess)
+            claimed = await leases.claim(session_names)
+            if claimed:
+                logger.info(f"Claimed {len(claimed)} sessions | node <c>{leases.node_id}</c> runs {len(leases.owned)}")
+        except sqlite3.Error as e:
+            logger.error(f"Lease store <c>{leases.filename}</c> is unavailable: {e}")
+        await self._stop_overdue()
+        await self._reconcile_sessions()
+
+    async def _stop_overdue(self):
+        leases = self._leases
+        if leases.overdue and leases.owned:
+            logger.warning(f"Leases are not renewed in time, stopping {len(leases.owned)} sessions")
+            owned = list(leases.owned)
+            leases.owned.clear()
+            await self._release(owned)
+
+    async def _guard(self):
+        """Stops sessions before their leases expire even when a renewal hangs, e.g. on a stalled shared volume."""
+        while True:
+            await sleep(max(self._leases.deadline - monotonic(), 0) + 1)
+            await self._stop_overdue()
+
+    async def _coordinate(self):
+        while True:
+            await sleep(self._leases.ttl / 3)
+            await self._rebalance()
+
+    async def run(self):
+        self._reload_proxies()
+        if not self._leases:
+            await self._reconcile_sessions()
+            await self._watch()
+            return
+        await self._rebalance()
+        coordinator = asyncio.create_task(self._coordinate())
+        guard = asyncio.create_task(self._guard())
+        try:
+            await self._watch()
+        finally:
+            coordinator.cancel()
+            guard.cancel()
+            await self._stop_and_wait(self._tasks)
+            await self._leases.close()
+
+    async def _watch(self):
+        logger.info(f"Started {len(self._tasks)} sessions | {len(self._proxies)} proxies")
+        if not settings.WATCH_INTERVAL:
+            if self._leases:
+                # sessions follow the leases, the coordinator keeps reconciling them
+                await asyncio.Event().wait()
+            while self._tasks:
+                await asyncio.wait(list(self._tasks.values()))
+            return
+        while True:
+            tasks = list(self._tasks.values())
+            if tasks:
+                await asyncio.wait(tasks, timeout=settings.WATCH_INTERVAL)
+            elif self._leases:
+                await sleep(settings.WATCH_INTERVAL)
+            else:
+                return logger.info("All sessions finished")
+            if self._reload_proxies():
+                await self._reconcile_proxies()
+            before = len(self._tasks)
+            await self._reconcile_sessions()
+            if len(self._tasks) != before:
+                logger.info(f"Running {len(self._tasks)} sessions | {len(self._proxies)} proxies")
+
+
+async def run_tasks():
+    from bot.utils.control import start_control_server
 
+    from bot.utils.codes import video_codes
 
-async def run_tasks(tg_clients: list[Client]):
-    proxies = get_proxies()
-    proxies_cycle = cycle(proxies) if proxies else None
-    tasks = [
-        asyncio.create_task(
-            run_tapper(tg_client=tg_client, proxy=next(proxies_cycle) if proxies_cycle else None)
-        )
-        for tg_client in tg_clients
-    ]
-    await asyncio.gather(*tasks)
+    fleet = FleetManager()
+    await start_control_server(fleet)
+    try:
+        await fleet.run()
+    finally:
+        await video_codes.flush()
@@ -0,0 +1,148 @@
+import asyncio
+import math
+import os
+import socket
+import sqlite3
+import threading
+from time import monotonic, time
+from typing import Callable, TypeVar
+
+from bot.config import settings
+from bot.utils.logger import logger
+
+_log = logger.opt(colors=True).bind(name=__name__)
+
+T = TypeVar("T")
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS nodes (node TEXT PRIMARY KEY, expires_at REAL NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS leases (session TEXT PRIMARY KEY, node TEXT NOT NULL, expires_at REAL NOT NULL)",
+)
+
+
+def default_node_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class SessionLeases:
+    """
+    Renewable session leases in a SQLite file shared by all nodes, e.g. on a shared volume.
+    Every node heartbeats, keeps its fair share (sessions / alive nodes) and claims free or expired leases,
+    so work moves to the rest of the fleet when a node joins or dies. Expiry uses wall clock,
+    nodes are expected to be NTP synced; a node stops its sessions on its own once renewal is overdue.
+    """
+
+    def __init__(self, filename: str, node_id: str, ttl: float):
+        self.filename = filename
+        self.node_id = node_id
+        self.ttl = ttl
+        self.owned: set[str] = set()
+        self._renewed_at = 0.0
+        self._connection: sqlite3.Connection | None = None
+        # a cancelled caller does not stop its worker thread, transactions still run one at a time
+        self._lock = threading.Lock()
+
+    def _transaction(self, func: Callable[[sqlite3.Connection, float], T]) -> T:
+        with self._lock:
+            if self._connection is None:
+                # rollback journal instead of WAL: WAL shared memory does not work over network file systems;
+                # a locked store fails well within the renew interval, so the next renewal is still in time
+                self._connection = sqlite3.connect(self.filename, timeout=self.ttl / 6, isolation_level=None,
+                                                   check_same_thread=False)
+                for statement in SCHEMA:
+                    self._connection.execute(statement)
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                result = func(self._connection, time())
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("COMMIT")
+            return result
+
+    def _share(self, connection: sqlite3.Connection, now: float, total: int) -> int:
+        alive = connection.execute("SELECT COUNT(*) FROM nodes WHERE expires_at > ?", (now,)).fetchone()[0]
+        return math.ceil(total / max(alive, 1))
+
+    def _renew(self, total: int) -> tuple[set[str], list[str]]:
+        def renew(connection: sqlite3.Connection, now: float):
+            expires_at = now + self.ttl
+            connection.execute("INSERT OR REPLACE INTO nodes (node, expires_at) VALUES (?, ?)",
+                               (self.node_id, expires_at))
+            connection.execute("DELETE FROM nodes WHERE expires_at <= ?", (now,))
+            connection.execute("UPDATE leases SET expires_at = ? WHERE node = ? AND expires_at > ?",
+                               (expires_at, self.node_id, now))
+            owned = {row[0] for row in connection.execute(
+                "SELECT session FROM leases WHERE node = ? AND expires_at > ?", (self.node_id, now))}
+            excess = sorted(owned)[self._share(connection, now, total):]
+            return owned, excess
+        return self._transaction(renew)
+
+    def _claim(self, candidates: list[str]) -> set[str]:
+        def claim(connection: sqlite3.Connection, now: float):
+            leases = {session: (node, expires_at) for session, node, expires_at
+                      in connection.execute("SELECT session, node, expires_at FROM leases")}
+            owned = {session for session, (node, expires_at) in leases.items()
+                     if node == self.node_id and expires_at > now}
+            free = [session for session in candidates if session not in leases or leases[session][1] <= now]
+            claimed = free[:max(self._share(connection, now, len(candidates)) - len(owned), 0)]
+            connection.executemany("INSERT OR REPLACE INTO leases (session, node, expires_at) VALUES (?, ?, ?)",
+                                   [(session, self.node_id, now + self.ttl) for session in claimed])
+            return owned | set(claimed)
+        return self._transaction(claim)
+
+    def _release(self, sessions: list[str]):
+        self._transaction(lambda connection, _: connection.executemany(
+            "DELETE FROM leases WHERE session = ? AND node = ?", [(session, self.node_id) for session in sessions]))
+
+    @property
+    def deadline(self) -> float:
+        """Monotonic time after which leases may be taken over by another node, sessions must not keep running."""
+        return self._renewed_at + self.ttl * 2 / 3
+
+    @property
+    def overdue(self) -> bool:
+        return monotonic() > self.deadline
+
+    async def renew(self, total: int) -> tuple[set[str], list[str]]:
+        """Returns (lost, excess): leases taken over by other nodes and sessions above the fair share."""
+        started = monotonic()
+        owned, excess = await asyncio.to_thread(self._renew, total)
+        self._renewed_at = started
+        lost = self.owned - owned
+        self.owned = owned
+        return lost, excess
+
+    async def release(self, sessions: list[str]):
+        if sessions:
+            await asyncio.to_thread(self._release, sessions)
+            self.owned.difference_update(sessions)
+
+    async def claim(self, candidates: list[str]) -> set[str]:
+        """Claims free leases up to the fair share, returns newly owned sessions."""
+        owned = await asyncio.to_thread(self._claim, candidates)
+        claimed = owned - self.owned
+        self.owned = owned
+        return claimed
+
+    def _close(self):
+        try:
+            self._transaction(lambda connection, _: (
+                connection.execute("DELETE FROM leases WHERE node = ?", (self.node_id,)),
+                connection.execute("DELETE FROM nodes WHERE node = ?", (self.node_id,))))
+        finally:
+            with self._lock:
+                if self._connection is not None:
+                    self._connection.close()
+                    self._connection = None
+
+    async def close(self):
+        """Gives all leases up, waits for a transaction still running in a worker thread first."""
+        self.owned.clear()
+        await asyncio.to_thread(self._close)
+
+
+def create_leases() -> SessionLeases | None:
+    if not settings.LEASES:
+        return None
+    return SessionLeases(settings.LEASE_FILE, settings.NODE_ID or default_node_id(), settings.LEASE_TTL)
@@ -0,0 +1,120 @@
+import asyncio
+from time import monotonic
+
+from aiohttp import ClientSession
+
+from bot.config import settings
+from bot.utils.logger import logger
+from bot.utils.rate_limiter import rate_limiter
+
+_log = logger.opt(colors=True).bind(name=__name__)
+
+
+class LineaError(Exception):
+    pass
+
+
+class LineaBalances:
+    """
+    Shared Linea balance lookups: addresses requested by all sessions within LINEA_BATCH_WINDOW are queried
+    with one balancemulti call (up to `batch_size` addresses), results and ETH/USD price are cached for
+    LINEA_CACHE_TTL seconds.
+    """
+
+    api_url = "https://api.lineascan.build/api"
+    batch_size = 20
+
+    def __init__(self):
+        self._balances: dict[str, tuple[float, int]] = {}
+        self._waiters: dict[str, list[asyncio.Future]] = {}
+        self._batcher: asyncio.Task | None = None
+        self._batch_full: asyncio.Event | None = None
+        self._eth_price: tuple[float, float] | None = None
+        self._eth_price_lock: asyncio.Lock | None = None
+
+    def _cached(self, key: str) -> int | None:
+        cached = self._balances.get(key)
+        if cached and monotonic() - cached[0] < settings.LINEA_CACHE_TTL:
+            return cached[1]
+        return None
+
+    async def _get(self, params: dict):
+        params = dict(params, apikey=settings.LINEA_API)
+        for _ in range(3):
+            await rate_limiter.acquire(self.api_url)
+            async with ClientSession() as session:
+                async with session.get(self.api_url, params=params) as response:
+                    if response.status == 429:
+                        rate_limiter.throttle(self.api_url, None, response.headers.get("Retry-After"))
+                        continue
+                    response.raise_for_status()
+                    response_json = await response.json(content_type=None)
+            if response_json.get("status") != "1":
+                # free tier answers "Max rate limit reached" with status 0 instead of 429
+                if "rate limit" in str(response_json.get("result")).lower():
+                    rate_limiter.throttle(self.api_url, None, None)
+                    continue
+                raise LineaError(f"Linea API error: {response_json.get('result')}")
+            return response_json.get("result")
+        raise LineaError("Linea API rate limit")
+
+    async def get_balance(self, address: str) -> int | None:
+        key = address.lower()
+        balance = self._cached(key)
+        if balance is not None:
+            return balance
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(key, []).append(future)
+        if self._batch_full is None:
+            self._batch_full = asyncio.Event()
+        if len(self._waiters) >= self.batch_size:
+            self._batch_full.set()
+        # one task drains the waiters batch by batch, until none are left
+        if self._batcher is None or self._batcher.done():
+            self._batcher = asyncio.create_task(self._run_batches())
+        return await future
+
+    async def _run_batches(self):
+        while self._waiters:
+            if len(self._waiters) < self.batch_size:
+                # a full batch is sent at once, a partial one waits for more addresses first
+                self._batch_full.clear()
+                try:
+                    await asyncio.wait_for(self._batch_full.wait(), settings.LINEA_BATCH_WINDOW)
+                except asyncio.TimeoutError:
+                    pass
+            batch = list(self._waiters)[:self.batch_size]
+            await self._run_batch(batch, {key: self._waiters.pop(key) for key in batch})
+
+    async def _run_batch(self, batch: list[str], waiters: dict[str, list[asyncio.Future]]):
+        try:
+            result = await self._get({"module": "account", "action": "balancemulti", "address": ",".join(batch),
+                                      "tag": "latest"})
+            now = monotonic()
+            for item in result:
+                self._balances[item["account"].lower()] = (now, int(item["balance"]))
+            for key, futures in waiters.items():
+                for future in futures:
+                    if not future.done():
+                        future.set_result(self._balances.get(key, (now, None))[1])
+        except Exception as e:
+            _log.warning(f"Linea balances of {len(waiters)} addresses failed: {e}")
+            for futures in waiters.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+
+    async def eth_price(self) -> float | None:
+        if self._eth_price and monotonic() - self._eth_price[0] < settings.LINEA_CACHE_TTL:
+            return self._eth_price[1]
+        if self._eth_price_lock is None:
+            self._eth_price_lock = asyncio.Lock()
+        async with self._eth_price_lock:
+            if self._eth_price and monotonic() - self._eth_price[0] < settings.LINEA_CACHE_TTL:
+                return self._eth_price[1]
+            result = await self._get({"module": "stats", "action": "ethprice"})
+            self._eth_price = (monotonic(), float(result["ethusd"]))
+            return self._eth_price[1]
+
+
+linea = LineaBalances()
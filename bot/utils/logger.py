@@ -1,6 +1,14 @@
+import atexit
 import sys
+import threading
+from queue import Full, Queue
+from time import monotonic
+
 from loguru import logger
 
+from bot.config import settings
+from bot.utils.rate_limiter import TokenBucket
+
 fmt = " | ".join((
     "<white>{time:YYYY-MM-DD HH:mm:ss}</white>",
     "<level>{level}</level>",
@@ -8,6 +16,100 @@ fmt = " | ".join((
     "<white><b>{message}</b></white>"
 ))
 
+
+def text_format(record) -> str:
+    if record["extra"].get("suppressed"):
+        return fmt + " (+{extra[suppressed]} similar suppressed)\n{exception}"
+    return fmt + "\n{exception}"
+
+
+class RepeatFilter:
+    """
+    Rate limit of repetitive INFO/DEBUG messages: one token bucket per session and call site.
+    Warnings and errors always pass, suppressed messages are counted in extra["suppressed"] of the next
+    passed one. One filter is shared by all sinks, a record is decided once and the decision is reused.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self._rate = rate
+        self._burst = burst
+        self._buckets: dict[tuple, TokenBucket] = {}
+        self._suppressed: dict[tuple, int] = {}
+        self._lock = threading.Lock()
+        self._record = None
+        self._passed = True
+
+    def __call__(self, record) -> bool:
+        if record["level"].no >= 30:
+            return True
+        with self._lock:
+            if record is not self._record:
+                self._record, self._passed = record, self._decide(record)
+            return self._passed
+
+    def _decide(self, record) -> bool:
+        key = (record["extra"].get("name"), record["file"].path, record["line"])
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self._rate, self._burst)
+        now = monotonic()
+        if bucket.delay(now) > 0:
+            self._suppressed[key] = self._suppressed.get(key, 0) + 1
+            return False
+        bucket.consume(now)
+        suppressed = self._suppressed.pop(key, 0)
+        if suppressed:
+            record["extra"]["suppressed"] = suppressed
+        return True
+
+
+class ThreadedSink:
+    """
+    Writes formatted messages from a background thread. Unlike loguru enqueue=True (multiprocessing pipe
+    with pickling) the event loop only pays for a queue put. When the stream can not keep up, messages
+    above max_queued are dropped and counted instead of growing the memory.
+    """
+
+    def __init__(self, stream, max_queued: int = 10000):
+        self._stream = stream
+        self._queue: Queue[str | None] = Queue(maxsize=max_queued)
+        self._dropped = 0
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def write(self, message: str):
+        try:
+            self._queue.put_nowait(message)
+        except Full:
+            self._dropped += 1
+
+    def _run(self):
+        while (message := self._queue.get()) is not None:
+            self._stream.write(message)
+            if self._queue.empty():
+                if self._dropped:
+                    dropped, self._dropped = self._dropped, 0
+                    self._stream.write(f"{dropped} log messages dropped, the log stream is too slow\n")
+                self._stream.flush()
+        self._stream.flush()
+
+    def stop(self):
+        if self._thread.is_alive():
+            self._queue.put(None, timeout=5)
+            self._thread.join(timeout=5)
+
+
+repeat_filter = RepeatFilter(*settings.LOG_RATE_LIMIT) if settings.LOG_RATE_LIMIT else None
+
 logger.remove()
-logger.add(sink=sys.stdout, level="INFO", format=fmt)
-logger = logger.opt(colors=True).bind(name="Default Logger")
\ No newline at end of file
+stdout_sink = ThreadedSink(sys.stdout) if settings.LOG_ENQUEUE else sys.stdout
+if settings.LOG_JSON:
+    logger.add(sink=stdout_sink, level=settings.LOG_LEVEL, serialize=True, filter=repeat_filter)
+else:
+    logger.add(sink=stdout_sink, level=settings.LOG_LEVEL, format=text_format, colorize=sys.stdout.isatty(),
+               filter=repeat_filter)
+if settings.LOG_FILE:
+    logger.add(sink=settings.LOG_FILE, level=settings.LOG_LEVEL, serialize=True, rotation="100 MB", retention=5,
+               filter=repeat_filter)
+logger = logger.opt(colors=True).bind(name="Default Logger")
@@ -0,0 +1,160 @@
+from bisect import bisect_left
+from typing import TYPE_CHECKING
+from urllib.parse import urlparse
+
+from bot.config import settings
+from bot.utils.logger import logger
+
+if TYPE_CHECKING:
+    from aiohttp import web
+
+_log = logger.opt(colors=True).bind(name=__name__)
+
+LabelsType = tuple[tuple[str, str], ...]
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _labels(labels: dict) -> LabelsType:
+    return tuple(sorted((key, str(getattr(value, "value", value))) for key, value in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: LabelsType, extra: tuple = ()) -> str:
+    items = labels + extra
+    if not items:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in items) + "}"
+
+
+def proxy_label(proxy: str | None) -> str:
+    """Proxy without credentials, safe to expose."""
+    if not proxy:
+        return "direct"
+    parsed = urlparse(proxy if "://" in proxy else f"http://{proxy}")
+    return f"{parsed.hostname}:{parsed.port}" if parsed.port else str(parsed.hostname)
+
+
+class Counter:
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._values: dict[LabelsType, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = _labels(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def collect(self) -> list[str]:
+        return [f"{self.name}{_format_labels(labels)} {value}" for labels, value in self._values.items()]
+
+
+class Gauge(Counter):
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        self._values[_labels(labels)] = value
+
+
+class Histogram:
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self._values: dict[LabelsType, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = _labels(labels)
+        data = self._values.get(key)
+        if data is None:
+            data = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+        index = bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            data[0][index] += 1
+        data[1] += value
+        data[2] += 1
+
+    def collect(self) -> list[str]:
+        lines = []
+        for labels, (counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(labels, (('le', str(bound)),))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(labels, (('le', '+Inf'),))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class Registry:
+
+    def __init__(self):
+        self._metrics: list[Counter | Gauge | Histogram] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+request_latency = registry.register(Histogram(
+    "memefi_request_duration_seconds", "GraphQL request latency by operation, proxy and outcome."))
+request_bytes = registry.register(Counter(
+    "memefi_request_bytes_total", "GraphQL payload bytes by operation and direction."))
+graphql_errors = registry.register(Counter(
+    "memefi_graphql_errors_total", "GraphQL responses with errors by operation."))
+retries = registry.register(Counter(
+    "memefi_retries_total", "Retried requests by operation and reason."))
+logins = registry.register(Counter(
+    "memefi_logins_total", "MemeFi logins by outcome."))
+telegram_latency = registry.register(Histogram(
+    "telegram_web_data_duration_seconds", "Telegram web data requests latency by outcome."))
+proxy_check_latency = registry.register(Histogram(
+    "proxy_check_duration_seconds", "Proxy check latency by proxy and outcome."))
+sessions = registry.register(Gauge(
+    "memefi_sessions", "Supervised sessions by health state."))
+session_restarts = registry.register(Counter(
+    "memefi_session_restarts_total", "Session restarts by reason."))
+clock_offset = registry.register(Gauge(
+    "server_clock_offset_seconds", "Estimated server clock minus local clock by host."))
+
+
+async def _metrics_handler(_: "web.Request") -> "web.Response":
+    from aiohttp import web
+
+    return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8",
+                        headers={"X-Content-Type-Options": "nosniff"})
+
+
+async def start_metrics_server() -> "web.AppRunner | None":
+    if not settings.METRICS:
+        return None
+    from aiohttp import web
+
+    app = web.Application()
+    app.router.add_get("/metrics", _metrics_handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host=settings.METRICS_HOST, port=settings.METRICS_PORT).start()
+    _log.info(f"Metrics available on <c>http://{settings.METRICS_HOST}:{settings.METRICS_PORT}/metrics</c>")
+    return runner
@@ -0,0 +1,181 @@
+import asyncio
+from email.utils import parsedate_to_datetime
+from time import monotonic, time
+from typing import Iterable
+from urllib.parse import urlparse
+
+from bot.config import settings
+from bot.utils.server_clock import server_clock
+
+
+class TokenBucket:
+
+    __slots__ = ("rate", "capacity", "waiters", "_tokens", "_updated", "_blocked_until")
+
+    rate: float
+    capacity: float
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self.waiters = 0
+        self._tokens = self.capacity
+        self._updated = monotonic()
+        self._blocked_until = 0.0
+
+    def configure(self, rate: float, capacity: float):
+        self._refill(monotonic())
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self._tokens = min(self._tokens, self.capacity)
+
+    def _refill(self, now: float):
+        if now > self._updated:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+    def delay(self, now: float) -> float:
+        """Seconds left until one token can be taken from the bucket."""
+        self._refill(now)
+        blocked = self._blocked_until - now
+        if self._tokens >= 1:
+            return max(blocked, 0)
+        if self.rate <= 0:
+            return max(blocked, 1)
+        return max(blocked, (1 - self._tokens) / self.rate)
+
+    def consume(self, now: float):
+        self._refill(now)
+        self._tokens -= 1
+
+    def idle(self, now: float) -> bool:
+        """Full, not blocked and nobody waits for it: no different from a new bucket."""
+        self._refill(now)
+        return not self.waiters and self._tokens >= self.capacity and self._blocked_until <= now
+
+    def block(self, seconds: float):
+        self._blocked_until = max(self._blocked_until, monotonic() + seconds)
+        self._tokens = 0
+
+
+class RateLimiter:
+    """
+    Token buckets per host, per proxy, per account and per (account, operation).
+    A request waits until every bucket it belongs to has a token, so a burst of one account
+    can not drain the budget of the proxy or of the whole gateway. Idle buckets are dropped once
+    their number doubles, sessions and proxies come and go.
+    """
+
+    min_evict_at = 1024
+
+    def __init__(self):
+        self._buckets: dict[tuple, TokenBucket] = {}
+        self._evict_at = self.min_evict_at
+
+    def _bucket(self, key: tuple, budget: list[float]) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self._evict_at:
+                self._evict_idle()
+            bucket = self._buckets[key] = TokenBucket(*budget)
+        return bucket
+
+    def _evict_idle(self):
+        now = monotonic()
+        for key in [key for key, bucket in self._buckets.items() if bucket.idle(now)]:
+            del self._buckets[key]
+        self._evict_at = max(self.min_evict_at, len(self._buckets) * 2)
+
+    def _buckets_for(self, url: str, proxy: str | None, account: str | None,
+                     operations: Iterable[str]) -> list[TokenBucket]:
+        host = urlparse(url).netloc
+        buckets = [self._bucket(("host", host), settings.RATE_LIMIT_HOSTS.get(host, settings.RATE_LIMIT_HOST))]
+        if proxy:
+            buckets.append(self._bucket(("proxy", proxy), settings.RATE_LIMIT_PROXY))
+        if account:
+            buckets.append(self._bucket(("account", account), settings.RATE_LIMIT_ACCOUNT))
+            for operation in operations:
+                budget = settings.RATE_LIMIT_OPERATIONS.get(operation)
+                if budget:
+                    buckets.append(self._bucket(("operation", account, operation), budget))
+        return buckets
+
+    async def acquire(self, url: str, proxy: str | None = None, account: str | None = None,
+                      operations: Iterable[str] = ()):
+        if not settings.RATE_LIMIT:
+            return
+        buckets = self._buckets_for(url, proxy, account, operations)
+        for bucket in buckets:
+            bucket.waiters += 1
+        try:
+            while True:
+                now = monotonic()
+                wait = max(bucket.delay(now) for bucket in buckets)
+                if wait <= 0:
+                    for bucket in buckets:
+                        bucket.consume(now)
+                    return
+                await asyncio.sleep(wait)
+        finally:
+            for bucket in buckets:
+                bucket.waiters -= 1
+
+    def budgets(self) -> dict:
+        return {"enabled": settings.RATE_LIMIT, "host": settings.RATE_LIMIT_HOST, "hosts": settings.RATE_LIMIT_HOSTS,
+                "proxy": settings.RATE_LIMIT_PROXY, "account": settings.RATE_LIMIT_ACCOUNT,
+                "operations": settings.RATE_LIMIT_OPERATIONS}
+
+    def set_budget(self, scope: str, budget: list[float], name: str | None = None):
+        """
+        Changes [rate, burst] of a scope at runtime: "host" (all hosts, or one by name), "proxy", "account"
+        or "operation" (by name). Existing buckets of the scope take it over at once.
+        """
+        rate, capacity = budget
+        if scope == "host" and name:
+            settings.RATE_LIMIT_HOSTS[name] = budget
+        elif scope == "host":
+            settings.RATE_LIMIT_HOST = budget
+        elif scope == "proxy":
+            settings.RATE_LIMIT_PROXY = budget
+        elif scope == "account":
+            settings.RATE_LIMIT_ACCOUNT = budget
+        elif scope == "operation" and name:
+            settings.RATE_LIMIT_OPERATIONS[name] = budget
+        else:
+            raise ValueError(f"unknown rate limit scope {scope!r}")
+        for key, bucket in self._buckets.items():
+            if key[0] != scope:
+                continue
+            if scope == "host" and (key[1] != name if name else key[1] in settings.RATE_LIMIT_HOSTS):
+                continue
+            if scope == "operation" and key[2] != name:
+                continue
+            bucket.configure(rate, capacity)
+
+    def throttle(self, url: str, proxy: str | None, retry_after: str | None) -> float:
+        """Blocks the exit point (proxy or direct host) after 429 response. Returns delay in seconds."""
+        delay = min(parse_retry_after(retry_after, default=settings.RATE_LIMIT_DEFAULT_RETRY_AFTER,
+                                      now=server_clock(url).now()),
+                    settings.RATE_LIMIT_MAX_RETRY_AFTER)
+        if proxy:
+            self._bucket(("proxy", proxy), settings.RATE_LIMIT_PROXY).block(delay)
+        else:
+            host = urlparse(url).netloc
+            self._bucket(("host", host), settings.RATE_LIMIT_HOSTS.get(host, settings.RATE_LIMIT_HOST)).block(delay)
+        return delay
+
+
+def parse_retry_after(value: str | None, default: float, now: float | None = None) -> float:
+    """Retry-After in seconds or as HTTP date, the latter compared with `now` of the server when known."""
+    if not value:
+        return default
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - (time() if now is None else now))
+    except (TypeError, ValueError):
+        return default
+
+
+rate_limiter = RateLimiter()
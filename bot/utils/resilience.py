@@ -0,0 +1,147 @@
+import asyncio
+import random
+from enum import Enum
+from functools import wraps
+from time import monotonic
+
+from aiohttp import ClientConnectorError, ClientError, ClientResponseError
+from python_socks import ProxyConnectionError, ProxyTimeoutError
+
+from bot.config import settings
+from bot.utils.logger import logger
+from bot.utils import metrics
+
+_log = logger.opt(colors=True).bind(name=__name__)
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class Retry(str, Enum):
+    IDEMPOTENT = "idempotent"
+    UNSENT_ONLY = "unsent_only"
+
+
+def is_transient(error: BaseException) -> bool:
+    if isinstance(error, ClientResponseError):
+        return error.status == 429 or error.status >= 500
+    return isinstance(error, (ClientError, asyncio.TimeoutError, TimeoutError, ProxyConnectionError, ProxyTimeoutError))
+
+
+def is_throttled(error: BaseException) -> bool:
+    """429: the gateway refused the request without processing it."""
+    return isinstance(error, ClientResponseError) and error.status == 429
+
+
+def is_unsent(error: BaseException) -> bool:
+    """True when the request provably never reached the server (connection to it was not established)."""
+    return isinstance(error, (ClientConnectorError, ProxyConnectionError, ProxyTimeoutError))
+
+
+def decorrelated_jitter(previous: float, base: float, cap: float) -> float:
+    return min(cap, random.uniform(base, max(base, previous * 3)))
+
+
+class CircuitBreaker:
+    """
+    Fleet-wide breaker of one operation. After CIRCUIT_BREAKER_THRESHOLD consecutive transient failures
+    calls fail fast for CIRCUIT_BREAKER_RESET seconds, then a single probe call decides whether to close it.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if monotonic() - self._opened_at < settings.CIRCUIT_BREAKER_RESET:
+            return "open"
+        return "half-open"
+
+    def before_call(self):
+        state = self.state
+        if state == "open" or (state == "half-open" and self._probe_in_flight):
+            raise CircuitOpenError(f"circuit of {self.name} is open")
+        if state == "half-open":
+            self._probe_in_flight = True
+
+    def on_success(self):
+        if self._opened_at is not None:
+            _log.info(f"Circuit of <c>{self.name}</c> closed")
+        self._failures = 0
+        self._opened_at = None
+        self._probe_in_flight = False
+
+    def on_cancel(self):
+        self._probe_in_flight = False
+
+    def on_failure(self):
+        self._failures += 1
+        if self._probe_in_flight or (self._opened_at is None and self._failures >= settings.CIRCUIT_BREAKER_THRESHOLD):
+            _log.warning(f"Circuit of <c>{self.name}</c> opened for <y>{settings.CIRCUIT_BREAKER_RESET}s</y> "
+                         f"after {self._failures} failures")
+            self._opened_at = monotonic()
+        self._probe_in_flight = False
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(operation: str) -> CircuitBreaker:
+    breaker = _breakers.get(operation)
+    if breaker is None:
+        breaker = _breakers[operation] = CircuitBreaker(operation)
+    return breaker
+
+
+def resilient(operation: str, retry: Retry = Retry.IDEMPOTENT):
+    """
+    Retries transient errors of MemeFiApi method with decorrelated-jitter backoff and guards it with
+    the circuit breaker of the operation. Non idempotent operations are retried only when the request
+    was not sent at all or was refused with 429. This is the only retry loop of an API call.
+    """
+    operation = getattr(operation, "value", operation)
+
+    def decorator(method):
+        @wraps(method)
+        async def wrapper(self, *args, **kwargs):
+            breaker = get_breaker(operation)
+            base, cap = settings.RETRY_BACKOFF
+            delay = base
+            for attempt in range(settings.RETRY_ATTEMPTS + 1):
+                try:
+                    breaker.before_call()
+                    result = await method(self, *args, **kwargs)
+                except asyncio.CancelledError:
+                    breaker.on_cancel()
+                    raise
+                except Exception as e:
+                    if not is_transient(e):
+                        # GraphQL and other application errors say nothing about the operation's health,
+                        # a probe that ends with one leaves the breaker as it was
+                        if not isinstance(e, CircuitOpenError):
+                            breaker.on_cancel()
+                        raise
+                    throttled = is_throttled(e)
+                    if throttled:
+                        # throttling is paced by the rate limiter, it says nothing about the operation's health
+                        breaker.on_cancel()
+                    else:
+                        breaker.on_failure()
+                    retryable = retry == Retry.IDEMPOTENT or throttled or is_unsent(e)
+                    if not retryable or attempt == settings.RETRY_ATTEMPTS:
+                        raise
+                    delay = decorrelated_jitter(delay, base, cap)
+                    metrics.retries.inc(operation=operation, reason="throttled" if throttled else type(e).__name__)
+                    _log.debug(f"{operation} | {type(e).__name__}, retry {attempt + 1} in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+                else:
+                    breaker.on_success()
+                    return result
+        return wrapper
+    return decorator
@@ -0,0 +1,68 @@
+from collections import deque
+from email.utils import parsedate_to_datetime
+from time import time
+from urllib.parse import urlparse
+
+from bot.config import settings
+from bot.utils import metrics
+from bot.utils.logger import logger
+
+_log = logger.opt(colors=True).bind(name=__name__)
+
+
+class ServerClock:
+    """
+    Offset of a server clock from the local one, estimated from HTTP Date headers.
+    Date of second D means the response was made at server time within [D, D + 1) while the request was
+    in flight between local sent and received time, so the offset lies within [D - received, D + 1 - sent].
+    Intersection of the recent intervals narrows it down well below a second; intervals that do not
+    intersect (local clock stepped, a proxy rewrote the header) restart the estimation.
+    """
+
+    def __init__(self, host: str, window: int = 32):
+        self.host = host
+        self.offset = 0.0
+        self.error: float | None = None
+        self._intervals: deque[tuple[float, float]] = deque(maxlen=window)
+        self._logged_offset = 0.0
+
+    def observe(self, date: str | None, sent: float, received: float):
+        if not settings.CLOCK_SYNC or not date:
+            return
+        try:
+            server = parsedate_to_datetime(date).timestamp()
+        except (TypeError, ValueError):
+            return
+        interval = (server - received, server + 1 - sent)
+        self._intervals.append(interval)
+        low = max(bound[0] for bound in self._intervals)
+        high = min(bound[1] for bound in self._intervals)
+        if low > high:
+            self._intervals.clear()
+            self._intervals.append(interval)
+            low, high = interval
+        self.offset = (low + high) / 2
+        self.error = (high - low) / 2
+        metrics.clock_offset.set(self.offset, host=self.host)
+        if abs(self.offset - self._logged_offset) >= 1:
+            self._logged_offset = self.offset
+            _log.info(f"Clock of <c>{self.host}</c> is <y>{self.offset:+.2f}s</y> (±{self.error:.2f}s) from local")
+
+    def now(self) -> float:
+        """Current server time, epoch seconds."""
+        return time() + self.offset
+
+    def until(self, timestamp: float) -> float:
+        """Seconds from now until a server timestamp, negative when it has passed."""
+        return timestamp - self.now()
+
+
+_clocks: dict[str, ServerClock] = {}
+
+
+def server_clock(url: str) -> ServerClock:
+    host = urlparse(url).netloc or url
+    clock = _clocks.get(host)
+    if clock is None:
+        clock = _clocks[host] = ServerClock(host)
+    return clock
@@ -0,0 +1,140 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+from time import time
+from typing import Callable, Collection
+
+from bot.config import settings
+from bot.utils.file_io import file_io
+from bot.utils.logger import logger
+
+_log = logger.opt(colors=True).bind(name=__name__)
+
+AUTH_KEY_SIZE = 256
+
+
+def inspect_session_file(path: str) -> tuple[str | None, str | None]:
+    """
+    Structural check of a pyrogram .session file, runs in a worker process.
+    Returns (fingerprint of the auth key, None) or (None, reason the file is not usable).
+    """
+    try:
+        with closing(sqlite3.connect(f"file:{path}?mode=ro", uri=True)) as connection:
+            if connection.execute("PRAGMA quick_check").fetchone()[0] != "ok":
+                return None, "corrupted database"
+            row = connection.execute("SELECT auth_key, user_id FROM sessions").fetchone()
+    except sqlite3.DatabaseError as e:
+        return None, f"not a session database: {e}"
+    if row is None or not row[0]:
+        return None, "no auth key"
+    if len(row[0]) != AUTH_KEY_SIZE:
+        return None, "malformed auth key"
+    return hashlib.sha256(row[0]).hexdigest()[:32], None
+
+
+def _inspect_many(paths: list[str]) -> list[tuple[str | None, str | None]]:
+    return [inspect_session_file(path) for path in paths]
+
+
+class SessionChecks:
+    """
+    Cached good/bad list of session files in SESSION_CHECK_FILE. A file is inspected again only when
+    its mtime changes; it counts as replaced (and its liveness unknown) only when its auth key changes,
+    pyrogram's own writes to the file do not. With SESSION_CHECK_LIVENESS structurally valid sessions
+    are confirmed with get_me, at most once per SESSION_CHECK_TTL.
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self._entries: dict[str, dict] | None = None
+        self._pool: ProcessPoolExecutor | None = None
+
+    async def _load(self) -> dict[str, dict]:
+        if self._entries is None:
+            try:
+                self._entries = await file_io.read_json(self.filename, default={})
+            except ValueError:
+                _log.warning(f"Session check cache <c>{self.filename}</c> is corrupted, checking all sessions")
+                self._entries = {}
+        return self._entries
+
+    async def _save(self, entries: dict[str, dict]):
+        # entries keep changing while the file thread serializes them, it gets copies
+        await file_io.write_json(self.filename, {name: dict(entry) for name, entry in entries.items()}, indent=2)
+
+    async def _inspect(self, names: list[str]) -> list[tuple[str | None, str | None]]:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=settings.SESSION_CHECK_WORKERS or None)
+        paths = [f"sessions/{name}.session" for name in names]
+        size = max(16, len(paths) // ((settings.SESSION_CHECK_WORKERS or os.cpu_count() or 1) * 4) + 1)
+        loop = asyncio.get_running_loop()
+        chunks = await asyncio.gather(*(loop.run_in_executor(self._pool, _inspect_many, paths[index:index + size])
+                                        for index in range(0, len(paths), size)))
+        return [result for chunk in chunks for result in chunk]
+
+    async def _check_alive(self, names: list[str], proxy_of: Callable[[str], str | None]):
+        from bot.core.telegram import check_session_alive, create_tg_client, set_proxy_for_tg_client, \
+            TelegramInvalidSessionException
+
+        semaphore = asyncio.Semaphore(settings.SESSION_CHECK_CONCURRENCY)
+
+        async def check(name: str):
+            entry = self._entries[name]
+            async with semaphore:
+                client = create_tg_client(name)
+                set_proxy_for_tg_client(client, proxy_of(name))
+                try:
+                    await check_session_alive(client)
+                except TelegramInvalidSessionException as e:
+                    entry["dead"] = str(e)
+                except Exception as e:
+                    # network or proxy trouble says nothing about the session, it is tried again next time
+                    _log.debug(f"{name} | Liveness unknown | {type(e).__name__}: {e}")
+                    return
+                entry["live_at"] = time()
+
+        _log.info(f"Checking {len(names)} sessions with get_me")
+        await asyncio.gather(*(check(name) for name in names))
+
+    async def check(self, mtimes: dict[str, float | None], proxy_of: Callable[[str], str | None] = lambda _: None,
+                    running: Collection[str] = ()) -> dict[str, str]:
+        """
+        Returns auth key fingerprints of the viable sessions among the given ones.
+        Liveness of running sessions is not checked, their session files are in use.
+        """
+        entries = await self._load()
+        stale = [name for name, mtime in mtimes.items() if name not in entries or entries[name]["mtime"] != mtime]
+        for name, (fingerprint, invalid) in zip(stale, await self._inspect(stale) if stale else []):
+            entry = entries.get(name)
+            if entry is None or entry.get("fingerprint") != fingerprint:
+                entry = entries[name] = {"fingerprint": fingerprint, "dead": None, "live_at": None}
+            entry.update(mtime=mtimes[name], invalid=invalid)
+        unconfirmed = []
+        if settings.SESSION_CHECK_LIVENESS:
+            expired = time() - settings.SESSION_CHECK_TTL
+            unconfirmed = [name for name in mtimes if name not in running and not entries[name]["invalid"]
+                           and not entries[name]["dead"] and (entries[name]["live_at"] or 0) < expired]
+            if unconfirmed:
+                await self._check_alive(unconfirmed, proxy_of)
+        if stale or unconfirmed:
+            await self._save(entries)
+            bad = {name: entries[name]["invalid"] or entries[name]["dead"] for name in set(stale) | set(unconfirmed)
+                   if entries[name]["invalid"] or entries[name]["dead"]}
+            for name, reason in sorted(bad.items()):
+                _log.warning(f"{name} | Session skipped: {reason}")
+            _log.info(f"Checked {len(set(stale) | set(unconfirmed))} session files | <r>{len(bad)}</r> bad")
+        return {name: entries[name]["fingerprint"] for name in mtimes
+                if not entries[name]["invalid"] and not entries[name]["dead"]}
+
+    async def mark_dead(self, name: str, reason: str):
+        """Session found dead by the farming run, skipped until its file is replaced."""
+        entries = await self._load()
+        if name in entries:
+            entries[name]["dead"] = reason
+            await self._save(entries)
+
+
+session_checks = SessionChecks(settings.SESSION_CHECK_FILE)
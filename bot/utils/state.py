@@ -0,0 +1,163 @@
+import asyncio
+import atexit
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from json import dumps, loads
+from time import time
+
+from bot.config import settings
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS account_state (
+    session TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (session, key)
+)
+"""
+
+
+def parse_timestamp(value) -> float | None:
+    """API datetimes (ISO 8601 with Z) and epoch numbers to epoch seconds."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return value / 1000 if value > 1e11 else float(value)
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+class StateStore:
+    """
+    Per-account state in SQLite (WAL). Everything is read into memory on open, reads never touch the disk,
+    writes are collected and flushed in one transaction every STATE_FLUSH_INTERVAL seconds from a thread.
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self._connection: sqlite3.Connection | None = None
+        self._values: dict[tuple[str, str], object] = {}
+        self._pending: dict[tuple[str, str], tuple[str, float]] = {}
+        self._lock = threading.Lock()
+        self._flusher: asyncio.Task | None = None
+
+    def _open(self):
+        if self._connection is not None:
+            return
+        os.makedirs(os.path.dirname(self.filename) or ".", exist_ok=True)
+        self._connection = sqlite3.connect(self.filename, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(SCHEMA)
+        for session, key, value in self._connection.execute("SELECT session, key, value FROM account_state"):
+            self._values[(session, key)] = loads(value)
+        atexit.register(self.close)
+
+    def get(self, session: str, key: str, default=None):
+        self._open()
+        return self._values.get((session, key), default)
+
+    def set(self, session: str, key: str, value):
+        self._open()
+        with self._lock:
+            self._values[(session, key)] = value
+            self._pending[(session, key)] = (dumps(value), time())
+        self._schedule_flush()
+
+    def account(self, session: str) -> "AccountState":
+        return AccountState(self, session)
+
+    def _schedule_flush(self):
+        if self._flusher is not None and not self._flusher.done():
+            return
+        try:
+            self._flusher = asyncio.get_running_loop().create_task(self._flush_later())
+        except RuntimeError:
+            self.flush()
+
+    async def _flush_later(self):
+        await asyncio.sleep(settings.STATE_FLUSH_INTERVAL)
+        await asyncio.to_thread(self.flush)
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            if not pending or self._connection is None:
+                return
+            with self._connection:
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO account_state (session, key, value, updated_at) VALUES (?, ?, ?, ?)",
+                    [(session, key, value, updated_at) for (session, key), (value, updated_at) in pending.items()])
+
+    def close(self):
+        if self._connection is not None:
+            self.flush()
+            self._connection.close()
+            self._connection = None
+
+
+class AccountState:
+    """Typed view of one session's state."""
+
+    __slots__ = ("_store", "_session")
+
+    def __init__(self, store: StateStore, session: str):
+        self._store = store
+        self._session = session
+
+    @property
+    def tapbot(self) -> dict | None:
+        """Last known tapbot config (damagePerSec, endsAt, isPurchased, ...)."""
+        return self._store.get(self._session, "tapbot")
+
+    @tapbot.setter
+    def tapbot(self, config: dict | None):
+        self._store.set(self._session, "tapbot", config)
+
+    @property
+    def tapbot_ends_at(self) -> float | None:
+        return parse_timestamp((self.tapbot or {}).get("endsAt"))
+
+    @property
+    def boss_level(self) -> int | None:
+        return self._store.get(self._session, "boss_level")
+
+    @boss_level.setter
+    def boss_level(self, level: int):
+        self._store.set(self._session, "boss_level", level)
+
+    @property
+    def casino_run_at(self) -> float | None:
+        return self._store.get(self._session, "casino_run_at")
+
+    @casino_run_at.setter
+    def casino_run_at(self, timestamp: float):
+        self._store.set(self._session, "casino_run_at", timestamp)
+
+    @property
+    def spins(self) -> int | None:
+        """Spin energy left after the last run."""
+        return self._store.get(self._session, "spins")
+
+    @spins.setter
+    def spins(self, spins: int):
+        if spins != self.spins:
+            self._store.set(self._session, "spins", spins)
+
+    @property
+    def campaign_tasks_pending(self) -> int | None:
+        """Video tasks left uncompleted by the last run."""
+        return self._store.get(self._session, "campaign_tasks_pending")
+
+    @campaign_tasks_pending.setter
+    def campaign_tasks_pending(self, count: int):
+        if count != self.campaign_tasks_pending:
+            self._store.set(self._session, "campaign_tasks_pending", count)
+
+
+state = StateStore(settings.STATE_FILE)
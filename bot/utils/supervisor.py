@@ -0,0 +1,307 @@
+import asyncio
+from contextvars import ContextVar
+from enum import Enum
+from time import monotonic, time
+from typing import Awaitable, Callable, TypeVar
+
+from bot.config import settings
+from bot.utils import metrics
+from bot.utils.concurrency import concurrency
+from bot.utils.logger import logger
+from bot.utils.resilience import decorrelated_jitter
+
+_log = logger.opt(colors=True).bind(name=__name__)
+
+T = TypeVar("T")
+
+
+class Health(str, Enum):
+    WAITING = "waiting"
+    RUNNING = "running"
+    SLEEPING = "sleeping"
+    BACKOFF = "backoff"
+    FAILED = "failed"
+    DONE = "done"
+
+
+class StepTimeout(asyncio.TimeoutError):
+
+    def __init__(self, step: str, timeout: float):
+        super().__init__(f"{step} did not finish in {timeout}s")
+        self.step = step
+
+
+class SleepClock:
+    """Planned waits of concurrent sleepers, their overlapping time is counted once."""
+
+    __slots__ = ("sleepers", "since", "slept", "until")
+
+    def __init__(self):
+        self.sleepers = 0
+        self.since = 0.0
+        self.slept = 0.0
+        self.until = 0.0
+
+    @property
+    def sleeping(self) -> bool:
+        return self.sleepers > 0
+
+    def enter(self, now: float, delay: float):
+        if not self.sleepers:
+            self.since = now
+        self.sleepers += 1
+        self.until = max(self.until, now + delay)
+
+    def leave(self, now: float):
+        self.sleepers -= 1
+        if not self.sleepers:
+            self.slept += now - self.since
+
+
+# clocks of the steps the current task runs in, a sleep is credited only to the steps that contain it
+_step_clocks: ContextVar[tuple[SleepClock, ...]] = ContextVar("step_clocks", default=())
+
+
+class SessionRecord:
+
+    __slots__ = ("health", "step", "progress_at", "idle_until", "sleep", "restarts", "error", "attempt", "stalled",
+                 "resumed", "wakeup")
+
+    def __init__(self):
+        self.health = Health.WAITING
+        self.step: str | None = None
+        self.progress_at = monotonic()
+        self.idle_until = 0.0
+        self.sleep = SleepClock()
+        self.restarts = 0
+        self.error: str | None = None
+        self.attempt: asyncio.Task | None = None
+        self.stalled = False
+        self.resumed = asyncio.Event()
+        self.resumed.set()
+        self.wakeup = asyncio.Event()
+
+    @property
+    def paused(self) -> bool:
+        return not self.resumed.is_set()
+
+
+class Supervisor:
+    """
+    Per-session health. Every step of a session (proxy check, web data, login, API calls) runs with
+    a deadline from STEP_TIMEOUTS, a watchdog cancels running sessions without progress for
+    SUPERVISOR_STALL_TIMEOUT, failed and stalled attempts are restarted with backoff.
+    """
+
+    def __init__(self):
+        self._sessions: dict[str, SessionRecord] = {}
+        self._watchdog: asyncio.Task | None = None
+
+    @staticmethod
+    def _set_health(record: SessionRecord, health: Health):
+        if record.health is not health:
+            metrics.sessions.inc(-1, state=record.health)
+            metrics.sessions.inc(1, state=health)
+            record.health = health
+
+    def progress(self, session: str | None, step: str | None = None):
+        record = self._sessions.get(session)
+        if record is not None:
+            record.progress_at = monotonic()
+            if step:
+                record.step = step
+
+    async def _checkpoint(self, session: str | None):
+        """Paused sessions stop here, between steps, keeping their connections and tokens."""
+        record = self._sessions.get(session)
+        if record is not None and record.paused:
+            await record.resumed.wait()
+
+    async def step(self, session: str | None, step: str, awaitable: Awaitable[T]) -> T:
+        await self._checkpoint(session)
+        # API operations without a deadline of their own share the "api" one
+        timeout = settings.STEP_TIMEOUTS.get(step, settings.STEP_TIMEOUTS.get("api"))
+        if timeout is None:
+            result = await awaitable
+        else:
+            clock = SleepClock()
+            token = _step_clocks.set(_step_clocks.get() + (clock,))
+            try:
+                # the task copies the context, sleeps inside it are credited to this step
+                task = asyncio.ensure_future(awaitable)
+            finally:
+                _step_clocks.reset(token)
+            result = await self._within(clock, step, timeout, task)
+        self.progress(session, step)
+        return result
+
+    @staticmethod
+    async def _within(clock: SleepClock, step: str, timeout: float, task: asyncio.Future[T]) -> T:
+        """Like wait_for, but planned waits inside the step (e.g. FloodWait) do not count against its deadline."""
+        started = monotonic()
+        try:
+            while not task.done():
+                now = monotonic()
+                if clock.sleeping and clock.until > now:
+                    await asyncio.wait({task}, timeout=clock.until - now)
+                    continue
+                remaining = started + timeout + clock.slept - now
+                if remaining <= 0:
+                    raise StepTimeout(step, timeout)
+                await asyncio.wait({task}, timeout=remaining)
+            return task.result()
+        except asyncio.TimeoutError as e:
+            if isinstance(e, StepTimeout):
+                raise
+            raise StepTimeout(step, timeout) from None
+        finally:
+            if not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+
+    async def sleep(self, session: str, delay: float):
+        """Planned wait, not counted as a stall nor against the deadline of the step it is made in."""
+        record = self._sessions.get(session)
+        clocks = _step_clocks.get()
+        if record is not None and record.health in (Health.RUNNING, Health.SLEEPING):
+            # workflows of a session sleep concurrently, it is running again once the last of them wakes up
+            clocks += (record.sleep,)
+            record.idle_until = max(record.idle_until, monotonic() + delay)
+            self._set_health(record, Health.SLEEPING)
+        else:
+            record = None
+        now = monotonic()
+        for clock in clocks:
+            clock.enter(now, delay)
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            now = monotonic()
+            for clock in clocks:
+                clock.leave(now)
+            if record is not None:
+                if not record.sleep.sleeping and record.health is Health.SLEEPING:
+                    self._set_health(record, Health.RUNNING)
+                self.progress(session)
+        if record is not None:
+            await self._checkpoint(session)
+
+    def running(self, session: str):
+        """The attempt got its concurrency slot, stall detection starts now."""
+        record = self._sessions.get(session)
+        if record is not None:
+            record.progress_at = monotonic()
+            self._set_health(record, Health.RUNNING)
+
+    def pause(self, session: str) -> bool:
+        record = self._sessions.get(session)
+        if record is None or record.paused or record.health in (Health.DONE, Health.FAILED):
+            return False
+        record.resumed.clear()
+        _log.info(f"{session} | Paused")
+        return True
+
+    def resume(self, session: str) -> bool:
+        record = self._sessions.get(session)
+        if record is None or not record.paused:
+            return False
+        record.progress_at = monotonic()
+        record.resumed.set()
+        _log.info(f"{session} | Resumed")
+        return True
+
+    def prioritise(self, session: str) -> bool:
+        """Ends the restart backoff of the session and serves it the next concurrency slot."""
+        record = self._sessions.get(session)
+        if record is None or record.health in (Health.DONE, Health.FAILED):
+            return False
+        concurrency.prioritise(session)
+        record.wakeup.set()
+        return True
+
+    def forget(self, session: str):
+        record = self._sessions.pop(session, None)
+        if record is not None:
+            metrics.sessions.inc(-1, state=record.health)
+
+    def snapshot(self) -> dict[str, dict]:
+        now = monotonic()
+        return {session: {"health": record.health.value, "paused": record.paused, "step": record.step,
+                          "restarts": record.restarts, "idle_seconds": round(now - record.progress_at, 1),
+                          "wake_at": time() + record.idle_until - now if record.idle_until > now else None,
+                          "error": record.error}
+                for session, record in self._sessions.items()}
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(settings.SUPERVISOR_CHECK_INTERVAL)
+            now = monotonic()
+            for session, record in list(self._sessions.items()):
+                if record.health is not Health.RUNNING or record.paused or record.attempt is None \
+                        or record.attempt.done():
+                    continue
+                if now - max(record.progress_at, record.idle_until) > settings.SUPERVISOR_STALL_TIMEOUT:
+                    _log.warning(f"{session} | No progress for {now - record.progress_at:.0f}s "
+                                 f"after <c>{record.step or 'start'}</c>, restarting")
+                    record.stalled = True
+                    record.attempt.cancel()
+
+    async def supervise(self, session: str, run: Callable[[], Awaitable],
+                        permanent: tuple[type[BaseException], ...] = ()):
+        """Runs attempts of the session until one finishes or fails with a permanent error."""
+        previous = self._sessions.get(session)
+        if previous is not None:
+            metrics.sessions.inc(-1, state=previous.health)
+        record = self._sessions[session] = SessionRecord()
+        metrics.sessions.inc(1, state=record.health)
+        if self._watchdog is None or self._watchdog.done():
+            self._watchdog = asyncio.create_task(self._watch())
+        base, cap = settings.SUPERVISOR_BACKOFF
+        delay = base
+        try:
+            while True:
+                await self._checkpoint(session)
+                record.stalled, record.step, record.idle_until = False, None, 0.0
+                record.attempt = asyncio.ensure_future(run())
+                await asyncio.wait({record.attempt})
+                if record.attempt.cancelled() and not record.stalled:
+                    raise asyncio.CancelledError
+                error = None if record.attempt.cancelled() else record.attempt.exception()
+                if not record.stalled and error is None:
+                    self._set_health(record, Health.DONE)
+                    return
+                if isinstance(error, permanent):
+                    self._set_health(record, Health.FAILED)
+                    record.error = f"{type(error).__name__}: {error}"
+                    raise error
+                record.error = "stalled" if record.stalled else f"{type(error).__name__}: {error}"
+                if record.restarts >= settings.SUPERVISOR_MAX_RESTARTS:
+                    self._set_health(record, Health.FAILED)
+                    _log.error(f"{session} | Giving up after {record.restarts} restarts | {record.error}")
+                    return
+                reason = "stalled" if record.stalled else \
+                    "timeout" if isinstance(error, asyncio.TimeoutError) else "error"
+                metrics.session_restarts.inc(reason=reason)
+                record.restarts += 1
+                delay = decorrelated_jitter(delay, base, cap)
+                self._set_health(record, Health.BACKOFF)
+                _log.warning(f"{session} | Restart {record.restarts}/{settings.SUPERVISOR_MAX_RESTARTS} "
+                             f"in <y>{delay:.0f}s</y> | {record.error}")
+                record.idle_until = monotonic() + delay
+                record.wakeup.clear()
+                try:
+                    await asyncio.wait_for(record.wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                self._set_health(record, Health.WAITING)
+        finally:
+            if record.attempt is not None and not record.attempt.done():
+                record.attempt.cancel()
+                await asyncio.gather(record.attempt, return_exceptions=True)
+            # finished sessions stay visible with their final state, stopped ones are forgotten
+            if record.health not in (Health.DONE, Health.FAILED) and self._sessions.get(session) is record:
+                metrics.sessions.inc(-1, state=record.health)
+                del self._sessions[session]
+
+
+supervisor = Supervisor()